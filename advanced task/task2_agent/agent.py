@@ -1,10 +1,16 @@
+import json
 import json5
 import re
+import threading
 import time
 import os
 import sys
 from dotenv import load_dotenv
-from llm import OpenAICompatibleClient
+from llm import OpenAICompatibleClient, ModelRouter
+from checkpoint import SessionCheckpoint
+from session import SessionHistory, shared_prompt
+from planner import PlanError, build_plan_prompt, execute_plan, parse_plan
+from profiling import NULL_PROFILER, StepProfiler, format_report
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(os.path.join(current_dir, "tool"))
@@ -12,15 +18,36 @@ from tool.tool import *
 
 
 class ReactAgent:
-    def __init__(self, api_key: str = "", url: str = "") -> None:
+    def __init__(
+        self,
+        api_key: str = "",
+        url: str = "",
+        router: ModelRouter | None = None,
+        answer_cache=None,
+    ) -> None:
+        """
+        Args:
+            api_key: LLM 服务的 API Key
+            url: LLM 服务地址
+            router: 多档模型路由（或 HedgedClient 等同接口的客户端），指定后替代默认的单一模型
+            answer_cache: 语义答案缓存（answer_cache.SemanticAnswerCache），相近的问题直接返回缓存答案
+        """
         self.api_key = api_key
+        self.answer_cache = answer_cache
         self.tools = ReactTools()
-        self.model = OpenAICompatibleClient(
+        self.model = router or OpenAICompatibleClient(
             model="deepseek-chat",
             api_key=api_key,
             base_url=url,
         )
         self.system_prompt = self._build_system_prompt()
+        self.plan_prompt = build_plan_prompt(
+            self.tools.get_tool_descriptions(), time.strftime("%Y-%m-%d %H:%M", time.localtime())
+        )
+        # 最近一次 run 的统计信息
+        self.last_run_stats: dict = {}
+        # run(profile=True) 期间的内存分析器
+        self._profiler = NULL_PROFILER
 
     def _build_system_prompt(self) -> str:
         """构建系统提示，直接从工具类获取描述"""
@@ -32,7 +59,7 @@ class ReactAgent:
 
         tool_names = list(self.tools._tools_map.keys())
 
-        prompt = f"""现在时间是 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}。你是一位智能助手，可以使用以下工具：
+        prompt = f"""现在时间是 {time.strftime('%Y-%m-%d %H:%M', time.localtime())}。你是一位智能助手，可以使用以下工具：
 
 {chr(10).join(tool_info)}
 
@@ -49,7 +76,8 @@ class ReactAgent:
 最终答案：基于所有信息给出最终答案
 
 开始！"""
-        return prompt
+        # 相同工具配置的 Agent 共用同一个系统提示对象
+        return shared_prompt(tuple(tool_names), prompt)
 
     # 解析大模型的回答
     def _parse_action(self, text: str, verbose: bool = False) -> tuple[str, dict]:
@@ -85,19 +113,34 @@ class ReactAgent:
         return action, action_input_dict
 
     # TODO:这里要改成更加通用的形式
-    def _execute_action(self, action: str, action_input: dict) -> str:
-        """执行指定的行动，使用解耦后的 tools 管理器"""
+    def _execute_action(
+        self, action: str, action_input: dict, timeout: float | None = None
+    ) -> tuple[str, int, int]:
+        """执行指定的行动，使用解耦后的 tools 管理器
+
+        Args:
+            action: 工具名
+            action_input: 工具参数
+            timeout: 剩余时间预算（秒）
+
+        Returns:
+            (观察结果, 压缩前 token 数, 压缩后 token 数)
+        """
         # 检查工具是否存在于我们的注册表中
         if action in self.tools._tools_map:
             try:
-                # 动态调用工具函数并传入参数
-                # 使用 **action_input 将字典解包为命名参数
-                results = self.tools.execute_tool(action, **action_input)
-                return f"观察：{results}"
+                # 参数整体作为字典传入，模型给出的 timeout 等同名参数由校验器丢弃，不会与关键字参数冲突
+                results = self.tools.execute_tool(action, action_input, timeout=timeout)
             except Exception as e:
-                return f"观察：执行工具 {action} 时出错: {str(e)}"
+                return f"观察：执行工具 {action} 时出错: {str(e)}", 0, 0
+            # 超出工具预算的结果先在本地压缩，再进入对话历史
+            query = " ".join(str(value) for value in action_input.values())
+            results, raw_tokens, kept_tokens = self.tools.fit_observation(
+                action, results, query
+            )
+            return f"观察：{results}", raw_tokens, kept_tokens
 
-        return f"观察：未知行动 '{action}'，请尝试从已知工具列表中选择。"
+        return f"观察：未知行动 '{action}'，请尝试从已知工具列表中选择。", 0, 0
 
     def _format_response(self, response_text: str) -> str:
         """格式化最终响应"""
@@ -105,19 +148,262 @@ class ReactAgent:
             return response_text.split("最终答案：")[-1].strip()
         return response_text
 
-    def run(self, query: str, max_iterations: int = 3, verbose: bool = True) -> str:
+    @staticmethod
+    def _is_final_answer(response: str) -> bool:
+        """是否是模型给出的真正最终答案（LLM 调用失败返回的错误信息不算）"""
+        return "最终答案：" in response and not response.startswith("错误")
+
+    @staticmethod
+    def _remaining(deadline: float | None) -> float | None:
+        """距截止时间的剩余秒数，没有截止时间返回 None，已超时返回 0"""
+        if deadline is None:
+            return None
+        return max(0.0, deadline - time.monotonic())
+
+    def _partial_answer(
+        self,
+        response: str,
+        last_observation: str,
+        stats: dict,
+        savings: list,
+        verbose: bool,
+        checkpoint: SessionCheckpoint | None,
+        history: SessionHistory,
+    ) -> str:
+        """时间预算耗尽：返回目前为止最好的答案并标记为部分答案"""
+        stats["partial"] = True
+        self._finish_stats(stats, savings, verbose, checkpoint, history)
+        if verbose:
+            print("[ReAct Agent] 时间预算已用完，返回部分答案")
+        if "最终答案：" in response:
+            answer = self._format_response(response)
+        elif last_observation:
+            # 模型还没给出答案时，目前收集到的最新信息比 Thought/Action 文本更有用
+            answer = f"目前获得的信息：{last_observation.removeprefix('观察：')}"
+        else:
+            answer = "抱歉，在时间预算内未能得到答案。"
+        return f"（部分答案，已超出时间预算）{answer}"
+
+    def _restore_session(
+        self, checkpoint: SessionCheckpoint, query: str, stats: dict, savings: list
+    ) -> tuple[SessionHistory, int, str | None]:
+        """从检查点恢复会话
+
+        Returns:
+            (对话历史, 下一次迭代的序号, 已完成会话的最终答案或 None)
+        """
+        records = checkpoint.load()
+        if not records:
+            chat_history = self._new_history(query)
+            checkpoint.append({"type": "start", "messages": chat_history.to_messages()})
+            return chat_history, 0, None
+
+        messages = []
+        next_iteration = 0
+        chat_history = None
+        for record in records:
+            messages.extend(record.get("messages", []))
+            if record["type"] == "step":
+                next_iteration = record["iteration"] + 1
+                stats.update(record["stats"])
+                if record.get("saving"):
+                    savings.append(tuple(record["saving"]))
+            elif record["type"] == "finish":
+                stats.update(record["stats"])
+                chat_history = SessionHistory(messages)
+                return chat_history, next_iteration, record["answer"]
+        chat_history = SessionHistory(messages)
+        if chat_history[0].content == self.system_prompt:
+            chat_history.set_system(self.system_prompt)
+        return chat_history, next_iteration, None
+
+    def _new_history(self, query: str) -> SessionHistory:
+        history = SessionHistory()
+        history.append("system", self.system_prompt)
+        history.append("user", f"问题：{query}")
+        return history
+
+    def _finish_stats(
+        self,
+        stats: dict,
+        savings: list,
+        verbose: bool,
+        checkpoint: SessionCheckpoint | None = None,
+        history: SessionHistory | None = None,
+    ) -> None:
+        """统计观察压缩节省的 prompt token：每条观察在之后的每次 LLM 调用中都会被重发"""
+        if history is not None:
+            stats["session_memory"] = history.memory_usage()
+        if checkpoint is not None:
+            checkpoint.close()
+            stats["checkpoint"] = checkpoint.overhead()
+        stats["prompt_tokens_saved"] = sum(
+            saved * (stats["llm_calls"] - calls_before) for calls_before, saved in savings
+        )
+        stats["search_memory"] = dict(self.tools.session_memory.stats)
+        if verbose and savings:
+            print(
+                f"[ReAct Agent] 观察压缩: {stats['observation_tokens_raw']} -> "
+                f"{stats['observation_tokens_kept']} tokens，"
+                f"本次共节省约 {stats['prompt_tokens_saved']} 个 prompt token"
+            )
+
+    def _run_plan(
+        self,
+        query: str,
+        chat_history: SessionHistory,
+        stats: dict,
+        savings: list,
+        verbose: bool,
+        deadline: float | None,
+        checkpoint: SessionCheckpoint | None,
+    ) -> str | None:
+        """规划模式：一次生成完整的工具调用计划，按依赖并行执行，再一次调用 LLM 汇总答案
+
+        Returns:
+            最终答案；计划无法解析时返回 None，由调用方退回 ReAct 循环
+        """
+        GREEN = "\033[92m"
+        RESET = "\033[0m"
+        profiler = self._profiler
+        with profiler.phase("llm"):
+            plan_text = self.model.generate(
+                [
+                    {"role": "system", "content": self.plan_prompt},
+                    {"role": "user", "content": f"问题：{query}"},
+                ],
+                step="plan",
+                timeout=self._remaining(deadline),
+            )
+        stats["llm_calls"] += 1
+        try:
+            with profiler.phase("parse"):
+                steps = parse_plan(plan_text, self.tools._tools_map)
+        except PlanError as e:
+            stats["plan_fallback"] = True
+            if verbose:
+                print(f"[ReAct Agent] 计划无效（{e}），退回 ReAct 模式")
+            return None
+        stats["plan_steps"] = len(steps)
+        if verbose:
+            print(f"{GREEN}[ReAct Agent] 执行计划:\n{plan_text}{RESET}")
+
+        lock = threading.Lock()
+
+        def execute(tool: str, args: dict) -> str:
+            observation, raw_tokens, kept_tokens = self._execute_action(
+                tool, args, timeout=self._remaining(deadline)
+            )
+            with lock:
+                stats["observation_tokens_raw"] += raw_tokens
+                stats["observation_tokens_kept"] += kept_tokens
+                if raw_tokens > kept_tokens:
+                    savings.append((stats["llm_calls"], raw_tokens - kept_tokens))
+            return observation.removeprefix("观察：")
+
+        with profiler.phase("tool"):
+            results = execute_plan(steps, execute, timeout=self._remaining(deadline))
+        observation = "观察：\n" + "\n".join(
+            f"[{step.id}] {step.tool} {json.dumps(step.args, ensure_ascii=False)}: {results[step.id]}"
+            for step in steps
+        )
+        if verbose:
+            print(f"{GREEN}[ReAct Agent] 观察结果:\n{observation}{RESET}")
+        with profiler.phase("history"):
+            chat_history.append("assistant", plan_text)
+            chat_history.append("user", f"{observation}\n请根据以上观察直接给出最终答案，格式为“最终答案：……”。")
+        if self._remaining(deadline) == 0:
+            return self._partial_answer(
+                "", observation if steps else "", stats, savings, verbose, checkpoint, chat_history
+            )
+
+        with profiler.phase("prompt"):
+            messages = chat_history.to_messages()
+        with profiler.phase("llm"):
+            response = self.model.generate(
+                messages, step="final", timeout=self._remaining(deadline)
+            )
+        stats["llm_calls"] += 1
+        with profiler.phase("history"):
+            chat_history.append("assistant", response)
+        final_answer = self._format_response(response)
+        if self.answer_cache is not None and self._is_final_answer(response):
+            self.answer_cache.put(query, final_answer)
+        # LLM 调用失败时不写 finish，恢复会话时会重新调用模型
+        if checkpoint is not None and not response.startswith("错误"):
+            checkpoint.append(
+                {
+                    "type": "finish",
+                    "messages": chat_history.to_messages(-3),
+                    "stats": dict(stats),
+                    "answer": final_answer,
+                }
+            )
+        self._finish_stats(stats, savings, verbose, checkpoint, chat_history)
+        if verbose:
+            print(f"{GREEN}[ReAct Agent] 任务完成{RESET}")
+        return final_answer
+
+    def run(
+        self,
+        query: str,
+        max_iterations: int = 3,
+        verbose: bool = True,
+        session_id: str | None = None,
+        checkpoint_dir: str = "checkpoints",
+        timeout: float | None = None,
+        deadline: float | None = None,
+        mode: str = "react",
+        profile: bool = False,
+        profile_sites: bool = False,
+    ) -> str:
         """运行 ReAct Agent
 
         Args:
             query: 用户查询
             max_iterations: 最大迭代次数
             verbose: 是否显示中间执行过程
+            session_id: 会话 ID，指定后每一步都会写入检查点，进程重启后从最后完成的一步继续
+            checkpoint_dir: 检查点文件目录
+            timeout: 整个运行的时间预算（秒）
+            deadline: 绝对截止时间（time.monotonic() 的取值），与 timeout 同时指定时以 deadline 为准
+            mode: "react" 逐步思考和调用工具；"plan" 先一次性生成工具调用计划（有向无环图），
+                互不依赖的工具并行执行，最后一次 LLM 调用汇总答案，计划无效时退回 react
+            profile: 用 tracemalloc 统计每个阶段（prompt、llm、parse、tool、history）的内存分配，
+                报告保存在 last_run_stats["profile"]
+            profile_sites: 同时按代码行统计每个阶段的分配热点（开销较大），需要与 profile 一起开启
+
+        时间预算会作为剩余时间传给每一次 LLM 调用和工具调用；预算用完后不再开始新的步骤，
+        返回目前为止最好的答案，并在 last_run_stats["partial"] 中标记为部分答案。
         """
-        chat_history = [
-            {"role": "system", "content": self.system_prompt},
-            {"role": "user", "content": f"问题：{query}"},
-        ]
-
+        args = (query, max_iterations, verbose, session_id, checkpoint_dir, timeout, deadline, mode)
+        if not profile:
+            return self._run(*args)
+        self._profiler = StepProfiler(trace_sites=profile_sites)
+        self._profiler.start()
+        try:
+            return self._run(*args)
+        finally:
+            report = self._profiler.stop()
+            self._profiler = NULL_PROFILER
+            self.last_run_stats["profile"] = report
+            if verbose:
+                print(format_report(report))
+
+    def _run(
+        self,
+        query: str,
+        max_iterations: int,
+        verbose: bool,
+        session_id: str | None,
+        checkpoint_dir: str,
+        timeout: float | None,
+        deadline: float | None,
+        mode: str,
+    ) -> str:
+        profiler = self._profiler
+        if deadline is None and timeout is not None:
+            deadline = time.monotonic() + timeout
         # 绿色ANSI颜色代码
         GREEN = "\033[92m"
         RESET = "\033[0m"
@@ -125,22 +411,136 @@ class ReactAgent:
         if verbose:
             print(f"{GREEN}[ReAct Agent] 开始处理问题: {query}{RESET}")
 
-        for iteration in range(max_iterations):
+        # 每次运行使用独立的搜索记忆，跨迭代去重重复的搜索结果
+        self.tools.new_session()
+        stats = {
+            "answer_cache_hit": False,
+            "iterations": 0,
+            "llm_calls": 0,
+            "observation_tokens_raw": 0,
+            "observation_tokens_kept": 0,
+            "prompt_tokens_saved": 0,
+            "partial": False,
+            "mode": mode,
+            "plan_steps": 0,
+            "plan_fallback": False,
+        }
+        self.last_run_stats = stats
+        # 每条被压缩的观察：(加入历史时已发生的 LLM 调用次数, 节省的 token 数)
+        savings = []
+
+        if self.answer_cache is not None:
+            cached_answer = self.answer_cache.lookup(query)
+            if cached_answer is not None:
+                stats["answer_cache_hit"] = True
+                self._finish_stats(stats, savings, verbose)
+                if verbose:
+                    print(f"{GREEN}[ReAct Agent] 命中答案缓存，直接返回{RESET}")
+                return cached_answer
+
+        checkpoint = None
+        start_iteration = 0
+        if session_id:
+            checkpoint = SessionCheckpoint(session_id, checkpoint_dir)
+            chat_history, start_iteration, final_answer = self._restore_session(
+                checkpoint, query, stats, savings
+            )
+            if final_answer is not None:
+                self._finish_stats(stats, savings, verbose, checkpoint, chat_history)
+                if verbose:
+                    print(f"{GREEN}[ReAct Agent] 会话 {session_id} 已完成，直接返回答案{RESET}")
+                return final_answer
+            if verbose and start_iteration:
+                print(f"{GREEN}[ReAct Agent] 从检查点恢复，继续第 {start_iteration + 1} 次思考{RESET}")
+        else:
+            chat_history = self._new_history(query)
+        # 恢复的会话可能已经用完迭代次数，此时返回最后一次模型响应
+        response = chat_history[-2].content if start_iteration else ""
+        last_observation = chat_history[-1].content if start_iteration else ""
+
+        if mode == "plan" and not start_iteration:
+            final_answer = self._run_plan(
+                query, chat_history, stats, savings, verbose, deadline, checkpoint
+            )
+            if final_answer is not None:
+                return final_answer
+
+        for iteration in range(start_iteration, max_iterations):
+            if self._remaining(deadline) == 0:
+                return self._partial_answer(
+                    response, last_observation, stats, savings, verbose, checkpoint, chat_history
+                )
+            stats["iterations"] = iteration + 1
             if verbose:
                 print(f"{GREEN}[ReAct Agent] 第 {iteration + 1} 次思考...{RESET}")
 
-            # 获取模型响应
-            response = self.model.generate(chat_history)
+            # 获取模型响应：最后一轮只能给出答案，直接按 final 步骤路由
+            step = "final" if iteration == max_iterations - 1 else "action"
+            previous_response = response
+            with profiler.phase("prompt"):
+                messages = chat_history.to_messages()
+            with profiler.phase("llm"):
+                response = self.model.generate(
+                    messages, step=step, timeout=self._remaining(deadline)
+                )
+            stats["llm_calls"] += 1
+            if self._remaining(deadline) == 0 and response.startswith("错误:"):
+                # LLM 调用因预算耗尽而失败，退回上一次的模型响应
+                return self._partial_answer(
+                    previous_response,
+                    last_observation,
+                    stats,
+                    savings,
+                    verbose,
+                    checkpoint,
+                    chat_history,
+                )
 
             if verbose:
                 print(f"{GREEN}[ReAct Agent] 模型响应:\n{response}{RESET}")
 
-            chat_history.append({"role": "assistant", "content": response})
+            with profiler.phase("history"):
+                chat_history.append("assistant", response)
             # 解析行动
-            action, action_input = self._parse_action(response, verbose=verbose)
+            with profiler.phase("parse"):
+                action, action_input = self._parse_action(response, verbose=verbose)
 
             if not action or action == "最终答案" or "最终答案：" in response:
+                if (
+                    step != "final"
+                    and isinstance(self.model, ModelRouter)
+                    and self.model.has_route("final")
+                ):
+                    # 中间档模型决定收尾，最终答案交给 final 档重新生成
+                    chat_history.pop()
+                    with profiler.phase("prompt"):
+                        messages = chat_history.to_messages()
+                    with profiler.phase("llm"):
+                        regenerated = self.model.generate(
+                            messages, step="final", timeout=self._remaining(deadline)
+                        )
+                    stats["llm_calls"] += 1
+                    # final 档没有给出最终答案（调用失败或又选择了行动）时，沿用中间档的回答
+                    if self._is_final_answer(regenerated):
+                        response = regenerated
+                    elif verbose:
+                        print(f"{GREEN}[ReAct Agent] final 档未给出最终答案，沿用中间档的回答{RESET}")
+                    with profiler.phase("history"):
+                        chat_history.append("assistant", response)
                 final_answer = self._format_response(response)
+                if self.answer_cache is not None and self._is_final_answer(response):
+                    self.answer_cache.put(query, final_answer)
+                # LLM 调用失败时不写 finish，恢复会话时会重新调用模型
+                if checkpoint is not None and not response.startswith("错误"):
+                    checkpoint.append(
+                        {
+                            "type": "finish",
+                            "messages": chat_history.to_messages(-1),
+                            "stats": dict(stats),
+                            "answer": final_answer,
+                        }
+                    )
+                self._finish_stats(stats, savings, verbose, checkpoint, chat_history)
                 if verbose:
                     print(f"{GREEN}[ReAct Agent] 任务完成{RESET}")
                 return final_answer
@@ -151,15 +551,39 @@ class ReactAgent:
                 )
 
             # 执行行动
-            observation = self._execute_action(action, action_input)
+            with profiler.phase("tool"):
+                observation, raw_tokens, kept_tokens = self._execute_action(
+                    action, action_input, timeout=self._remaining(deadline)
+                )
+            stats["observation_tokens_raw"] += raw_tokens
+            stats["observation_tokens_kept"] += kept_tokens
+            saving = None
+            if raw_tokens > kept_tokens:
+                saving = (stats["llm_calls"], raw_tokens - kept_tokens)
+                savings.append(saving)
 
             if verbose:
                 print(f"{GREEN}[ReAct Agent] 观察结果:\n{observation}{RESET}")
 
             # 更新当前文本以继续对话
-            chat_history.append({"role": "user", "content": observation})
+            with profiler.phase("history"):
+                chat_history.append("user", observation)
+            last_observation = observation
+
+            # 一步完成：只追加本步新增的两条消息
+            if checkpoint is not None:
+                checkpoint.append(
+                    {
+                        "type": "step",
+                        "iteration": iteration,
+                        "messages": chat_history.to_messages(-2),
+                        "stats": dict(stats),
+                        "saving": saving,
+                    }
+                )
 
         # 达到最大迭代次数，返回当前响应
+        self._finish_stats(stats, savings, verbose, checkpoint, chat_history)
         if verbose:
             print(f"{GREEN}[ReAct Agent] 达到最大迭代次数，返回当前响应{RESET}")
         return self._format_response(response)
@@ -169,9 +593,32 @@ if __name__ == "__main__":
     load_dotenv()
     api_key = os.getenv("DEEPSEEK_API_KEY")
     url = "https://api.deepseek.com/v1"
-    agent = ReactAgent(api_key=api_key, url=url)
+    router = None
+    # 配置了 FAST_MODEL 时，中间步骤走快速模型，最终答案走 deepseek-chat
+    if os.getenv("FAST_MODEL"):
+        router = ModelRouter(
+            tiers={
+                "fast": OpenAICompatibleClient(
+                    model=os.getenv("FAST_MODEL"),
+                    api_key=os.getenv("FAST_MODEL_API_KEY", api_key),
+                    base_url=os.getenv("FAST_MODEL_URL", url),
+                ),
+                "strong": OpenAICompatibleClient(
+                    model="deepseek-chat", api_key=api_key, base_url=url
+                ),
+            },
+            routes={
+                "action": ["fast", "strong"],
+                "plan": ["strong", "fast"],
+                "final": ["strong", "fast"],
+            },
+            latency_slo={"fast": 10.0, "strong": 60.0},
+        )
+    agent = ReactAgent(api_key=api_key, url=url, router=router)
 
     response = agent.run(
         "美国最近一次阅兵的原因有哪些？", max_iterations=3, verbose=True
     )
     print("最终答案：", response)
+    if router is not None:
+        print("模型档位统计：", router.stats())
@@ -0,0 +1,127 @@
+import re
+import threading
+import time
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+
+class SemanticAnswerCache:
+    """
+    本地语义答案缓存
+
+    用哈希字符 n-gram 的 TF-IDF 向量表示问题（不依赖外部 embedding 服务），
+    与缓存中过去的问题做余弦相似度比较，相似度超过阈值且答案未过期时直接返回答案。
+    向量存放在固定大小的矩阵中，超出容量时淘汰最久未命中的条目，内存占用有上限。
+    """
+
+    def __init__(
+        self,
+        capacity: int = 1000,
+        dim: int = 2048,
+        threshold: float = 0.85,
+        ttl: float = 3600.0,
+        ngram_range: tuple = (1, 3),
+    ) -> None:
+        """
+        Args:
+            capacity: 最多缓存的答案条数
+            dim: 哈希向量维度
+            threshold: 命中所需的最低余弦相似度。字符 n-gram 分不清只差一两个关键字的问题
+                （如“阅兵的原因”和“阅兵的时间”相似度约 0.6），默认值偏保守，
+                调低前请用真实问题集检查误命中
+            ttl: 答案有效期（秒）
+            ngram_range: 字符 n-gram 的长度范围
+        """
+        self.capacity = capacity
+        self.dim = dim
+        self.threshold = threshold
+        self.ttl = ttl
+        self.ngram_range = ngram_range
+        self._tf = np.zeros((capacity, dim), dtype=np.float32)
+        self._df = np.zeros(dim, dtype=np.float32)  # 每个维度出现在多少条缓存问题中
+        self._norms = np.zeros(capacity, dtype=np.float32)
+        self._norms_dirty = False
+        self._entries: OrderedDict = OrderedDict()  # 行号 -> (问题, 答案, 写入时间)，按最近使用排序
+        self._free_rows = list(range(capacity - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.stats = {"lookups": 0, "hits": 0, "evictions": 0, "expired": 0}
+
+    def _vectorize(self, text: str) -> tuple[np.ndarray, np.ndarray]:
+        """返回 (维度下标, 次数)，使用 crc32 保证不同进程的哈希一致"""
+        text = _NORMALIZE_PATTERN.sub("", text.lower())
+        counts: dict = {}
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                index = zlib.crc32(text[i : i + n].encode("utf-8")) % self.dim
+                counts[index] = counts.get(index, 0) + 1
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        # 次数做亚线性缩放，避免重复字符主导相似度
+        return indices, 1.0 + np.log(values)
+
+    def _idf(self) -> np.ndarray:
+        n = len(self._entries)
+        return np.log((1.0 + n) / (1.0 + self._df)) + 1.0
+
+    def _remove(self, row: int) -> None:
+        self._entries.pop(row)
+        self._df -= self._tf[row] > 0
+        self._tf[row] = 0.0
+        self._norms[row] = 0.0
+        self._free_rows.append(row)
+        self._norms_dirty = True
+
+    def lookup(self, query: str) -> str | None:
+        """查找相似问题的答案，未命中返回 None"""
+        indices, values = self._vectorize(query)
+        if indices.size == 0:
+            return None
+        with self._lock:
+            self.stats["lookups"] += 1
+            now = time.time()
+            for row in [r for r, (_, _, created) in self._entries.items() if now - created > self.ttl]:
+                self._remove(row)
+                self.stats["expired"] += 1
+            if not self._entries:
+                return None
+
+            idf = self._idf()
+            if self._norms_dirty:
+                # 只有缓存内容变化后才需要重算各行的 TF-IDF 范数
+                self._norms = np.linalg.norm(self._tf * idf, axis=1)
+                self._norms_dirty = False
+            query_weights = values * idf[indices]
+            query_norm = float(np.linalg.norm(query_weights))
+            # 查询向量很稀疏，只在其非零维度上计算点积
+            dots = self._tf[:, indices] @ (query_weights * idf[indices])
+            with np.errstate(divide="ignore", invalid="ignore"):
+                sims = np.where(self._norms > 0, dots / (self._norms * query_norm), 0.0)
+            row = int(np.argmax(sims))
+            if sims[row] < self.threshold or row not in self._entries:
+                return None
+            self._entries.move_to_end(row)
+            self.stats["hits"] += 1
+            return self._entries[row][1]
+
+    def put(self, query: str, answer: str) -> None:
+        """缓存问题及其最终答案"""
+        indices, values = self._vectorize(query)
+        if indices.size == 0:
+            return
+        with self._lock:
+            if not self._free_rows:
+                # 淘汰最久未命中的条目
+                self._remove(next(iter(self._entries)))
+                self.stats["evictions"] += 1
+            row = self._free_rows.pop()
+            self._tf[row, indices] = values
+            self._df[indices] += 1
+            self._entries[row] = (query, answer, time.time())
+            self._norms_dirty = True
+
+    def __len__(self) -> int:
+        return len(self._entries)
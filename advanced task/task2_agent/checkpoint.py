@@ -0,0 +1,82 @@
+import json
+import os
+import time
+
+
+def load_jsonl_records(path: str) -> list:
+    """读取 JSONL 文件中所有完整的记录
+
+    进程在写入中途崩溃时，最后一行不完整的记录会被截掉，避免后续追加的记录与之粘连。
+    """
+    if not os.path.exists(path):
+        return []
+    records = []
+    valid_bytes = 0
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                break
+            valid_bytes += len(line)
+        total_bytes = f.seek(0, os.SEEK_END)
+    if valid_bytes < total_bytes:
+        with open(path, "r+b") as f:
+            f.truncate(valid_bytes)
+    return records
+
+
+class SessionCheckpoint:
+    """
+    会话检查点（预写日志风格）
+
+    每个会话对应一个 JSONL 文件，每完成一步只追加一行记录，不重写整个文件。
+    恢复时按顺序回放全部记录；进程在写入中途崩溃时，最后一行不完整的记录会被忽略。
+    """
+
+    def __init__(self, session_id: str, directory: str = "checkpoints", fsync: bool = False) -> None:
+        """
+        Args:
+            session_id: 会话 ID，用作文件名
+            directory: 检查点文件所在目录
+            fsync: 每次追加后是否强制落盘（更安全，但更慢）
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f"{session_id}.wal")
+        self.fsync = fsync
+        self._file = None
+        # 检查点开销统计
+        self.stats = {"appends": 0, "bytes": 0, "total_ms": 0.0}
+
+    def load(self) -> list:
+        """读取全部已完成的记录"""
+        return load_jsonl_records(self.path)
+
+    def append(self, record: dict) -> None:
+        """追加一条记录"""
+        start = time.perf_counter()
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self._file.write(line)
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.stats["appends"] += 1
+        self.stats["bytes"] += len(line.encode("utf-8"))
+        self.stats["total_ms"] += (time.perf_counter() - start) * 1000
+
+    def overhead(self) -> dict:
+        """返回检查点开销统计，包含每步平均耗时（毫秒）"""
+        appends = self.stats["appends"]
+        return {
+            **self.stats,
+            "avg_ms": self.stats["total_ms"] / appends if appends else 0.0,
+        }
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,173 @@
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from dotenv import load_dotenv
+from checkpoint import load_jsonl_records
+from loadtest import build_agent, is_failed_answer
+
+
+def shard_of(record_id: str, shards: int) -> int:
+    """按 ID 的稳定哈希分片（内置 hash() 每个进程的种子不同，不能用于分片）"""
+    return zlib.crc32(str(record_id).encode("utf-8")) % shards
+
+
+def load_input(path: str, field: str) -> list:
+    """读取输入 JSONL，返回 [(序号, ID, 问题)]；没有 id 字段时以行号作为 ID"""
+    items = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            data = json.loads(line)
+            index = len(items)
+            items.append((index, str(data.get("id", index)), data[field]))
+    return items
+
+
+def run_shard(shard: int, items: list, path: str, args) -> dict:
+    """工作进程：用线程池并发运行本分片的问题，结果逐条追加到分片文件
+
+    每个线程一个 Agent 实例；每写入 flush_every 条或距上次刷新超过 flush_interval 秒刷新一次。
+    """
+    load_dotenv()
+    local = threading.local()
+    counts = {"done": 0, "errors": 0}
+
+    def one(item: tuple) -> dict:
+        index, record_id, query = item
+        start = time.perf_counter()
+        record = {"index": index, "id": record_id, "query": query}
+        try:
+            # 创建失败（如缺少 API Key）记为本条出错，不中断整个分片；下一条会重新尝试创建
+            agent = getattr(local, "agent", None)
+            if agent is None:
+                agent = local.agent = build_agent(args)
+            record["answer"] = agent.run(
+                query,
+                max_iterations=args.max_iterations,
+                verbose=False,
+                timeout=args.timeout,
+                mode=args.mode,
+            )
+            record["stats"] = {
+                key: agent.last_run_stats.get(key)
+                for key in ("iterations", "llm_calls", "partial", "answer_cache_hit")
+            }
+            if is_failed_answer(record["answer"]):
+                # 与压测的判定一致：LLM 失败和部分答案记为出错，续跑时重新运行
+                record["error"] = "LLM 调用失败或超出时间预算"
+        except Exception as e:
+            record["error"] = f"{type(e).__name__}: {e}"
+        record["latency_s"] = round(time.perf_counter() - start, 3)
+        record["written_at"] = time.time()
+        return record
+
+    with open(path, "a", encoding="utf-8") as out, ThreadPoolExecutor(
+        max_workers=args.concurrency
+    ) as pool:
+        unflushed = 0
+        last_flush = time.monotonic()
+        for future in as_completed([pool.submit(one, item) for item in items]):
+            # 只有当前线程写文件，不需要加锁
+            record = future.result()
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts["done"] += 1
+            counts["errors"] += "error" in record
+            unflushed += 1
+            if unflushed >= args.flush_every or time.monotonic() - last_flush >= args.flush_interval:
+                out.flush()
+                unflushed = 0
+                last_flush = time.monotonic()
+    return {"shard": shard, **counts}
+
+
+def merge_shards(shard_paths: list, items: list, output: str) -> int:
+    """合并分片输出，按输入顺序写出，返回写出的条数
+
+    同一序号可能在多个分片文件中各有记录（续跑时分片数变化）：成功的记录优先于出错的记录，
+    同类记录以 written_at 较晚的为准，不依赖文件名顺序。
+    """
+    wanted = {(index, record_id) for index, record_id, _ in items}
+    merged = {}
+    for path in shard_paths:
+        for record in load_jsonl_records(path):
+            if (record["index"], record["id"]) not in wanted:
+                continue
+            rank = ("error" not in record, record.get("written_at", 0.0))
+            previous = merged.get(record["index"])
+            if previous is None or rank >= ("error" not in previous, previous.get("written_at", 0.0)):
+                merged[record["index"]] = record
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        for index in sorted(merged):
+            f.write(json.dumps(merged[index], ensure_ascii=False) + "\n")
+    os.replace(tmp_path, output)
+    return len(merged)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ReactAgent 离线评测：按 ID 分片到多个进程，可断点续跑")
+    parser.add_argument("--input", required=True, help="输入 JSONL，每行包含 id（可选）和问题字段")
+    parser.add_argument("--output", default="eval_results.jsonl", help="合并后的输出 JSONL")
+    parser.add_argument("--field", default="query", help="问题所在的字段名")
+    parser.add_argument("--shards", type=int, default=os.cpu_count() or 1, help="分片数，即工作进程数")
+    parser.add_argument("--concurrency", type=int, default=8, help="每个进程内并发运行的 Agent 数")
+    parser.add_argument("--max-iterations", type=int, default=3, help="Agent 最大迭代次数")
+    parser.add_argument("--timeout", type=float, default=None, help="单个问题的时间预算（秒）")
+    parser.add_argument("--mode", choices=["react", "plan"], default="react", help="Agent 运行模式")
+    parser.add_argument("--flush-every", type=int, default=20, help="分片文件每写入多少条刷新一次")
+    parser.add_argument("--flush-interval", type=float, default=5.0, help="分片文件最长刷新间隔（秒）")
+    parser.add_argument("--stub", action="store_true", help="使用本地桩 LLM 和桩工具，不访问外部服务")
+    parser.add_argument("--llm-latency", default="lognormal:-0.7,0.5", help="桩 LLM 的延迟配置")
+    parser.add_argument("--tool-latency", default="uniform:0.1,0.5", help="桩工具的延迟配置")
+    parser.add_argument("--tool-calls", type=int, default=1, help="桩 LLM 每个问题调用工具的次数")
+    args = parser.parse_args()
+
+    items = load_input(args.input, args.field)
+    shard_dir = args.output + ".shards"
+    os.makedirs(shard_dir, exist_ok=True)
+    shard_paths = [os.path.join(shard_dir, f"shard-{k:03d}.jsonl") for k in range(args.shards)]
+
+    # 断点续跑：跳过已经成功完成的 ID（出错的记录会重新运行）；
+    # 读取目录下所有分片文件，两次运行的分片数不同也能续跑
+    existing = sorted(set(glob.glob(os.path.join(shard_dir, "shard-*.jsonl"))) | set(shard_paths))
+    completed = set()
+    for path in existing:
+        completed.update(r["id"] for r in load_jsonl_records(path) if "error" not in r)
+    pending = [[] for _ in range(args.shards)]
+    for item in items:
+        if item[1] not in completed:
+            pending[shard_of(item[1], args.shards)].append(item)
+    total = sum(len(p) for p in pending)
+    print(f"共 {len(items)} 条，已完成 {len(items) - total} 条，待运行 {total} 条，{args.shards} 个分片")
+
+    start = time.perf_counter()
+    done = errors = 0
+    if total:
+        with ProcessPoolExecutor(max_workers=args.shards) as pool:
+            futures = [
+                pool.submit(run_shard, k, pending[k], shard_paths[k], args)
+                for k in range(args.shards)
+                if pending[k]
+            ]
+            for future in as_completed(futures):
+                result = future.result()
+                done += result["done"]
+                errors += result["errors"]
+                print(f"分片 {result['shard']} 完成：{result['done']} 条，出错 {result['errors']} 条")
+    elapsed = time.perf_counter() - start
+
+    merged = merge_shards(existing, items, args.output)
+    if done:
+        print(f"本次运行 {done} 条，出错 {errors} 条，耗时 {elapsed:.1f}s，吞吐 {done / elapsed:.2f} 条/s")
+    print(f"已合并 {merged} 条结果到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
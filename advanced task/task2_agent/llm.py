@@ -1,5 +1,32 @@
+import ipaddress
 import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from urllib.parse import urlparse
 from openai import OpenAI
+from metrics import percentile
+
+# 限流器等公共模块放在 tool 目录中，和工具共用同一个进程级实例
+tool_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tool")
+if tool_dir not in sys.path:
+    sys.path.append(tool_dir)
+from rate_limit import get_limiter
+from compress import estimate_tokens
+
+
+def upstream_name(base_url: str) -> str:
+    """从服务地址推出限流使用的上游名称"""
+    host = urlparse(base_url).hostname or "llm"
+    try:
+        ipaddress.ip_address(host)
+        return host
+    except ValueError:
+        pass
+    host_parts = host.split(".")
+    return host_parts[-2] if len(host_parts) >= 2 else host_parts[0]
 
 
 class OpenAICompatibleClient:
@@ -7,22 +34,372 @@ class OpenAICompatibleClient:
     一个用于调用任何兼容OpenAI接口的LLM服务的客户端。
     """
 
-    def __init__(self, model: str, api_key: str, base_url: str):
+    def __init__(self, model: str, api_key: str, base_url: str, upstream: str | None = None):
         self.model = model
         self.client = OpenAI(api_key=api_key, base_url=base_url)
+        # 限流使用的上游名称，默认取域名主体，如 api.deepseek.com -> deepseek；
+        # IP 地址取完整地址，避免 127.0.0.1 和 10.0.0.1 都变成 "0"、共用一个限流桶
+        if upstream is None:
+            upstream = upstream_name(base_url)
+        self.upstream = upstream
 
-    def generate(self, messages: list) -> str:
-        """调用LLM API来生成回应。"""
-        print("正在调用大语言模型...")
+    def complete(
+        self,
+        messages: list,
+        timeout: float | None = None,
+        cancel_event: "CancelToken | None" = None,
+    ) -> tuple[str, dict]:
+        """调用LLM API，失败时直接抛出异常
+
+        Args:
+            messages: 对话消息列表
+            timeout: 本次请求的时间上限（秒）
+            cancel_event: 传入时以流式方式请求，取消后立即关闭连接并抛出 CancelledError
+
+        Returns:
+            (回应文本, token 用量 {"prompt_tokens", "completion_tokens"})
+        """
+        # 按 prompt 预估 token 数排队，返回后再按实际用量修正
+        estimated = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        limiter = get_limiter()
+        waited = limiter.acquire(self.upstream, tokens=estimated, max_wait=timeout)
+        client = self.client
+        if timeout is not None:
+            timeout = max(0.1, timeout - waited)
+            # 有时间上限的调用不自动重试，超时直接交给调用方处理（回退或放弃）
+            client = client.with_options(timeout=timeout, max_retries=0)
+        if cancel_event is not None:
+            return self._complete_cancellable(client, messages, estimated, cancel_event)
+        response = client.chat.completions.create(
+            model=self.model,
+            messages=messages,  # 这里换成了带有基于的列表
+            stream=False,
+        )
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
+        if response.usage is not None:
+            limiter.settle(self.upstream, estimated, response.usage.total_tokens)
+            usage["prompt_tokens"] = response.usage.prompt_tokens
+            usage["completion_tokens"] = response.usage.completion_tokens
+        return response.choices[0].message.content, usage
+
+    def _complete_cancellable(self, client, messages: list, estimated: int, cancel_event: "CancelToken") -> tuple[str, dict]:
+        """流式请求：取消时由取消方直接关闭连接，不必等到下一块到达"""
+        stream = client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        if not cancel_event.attach(stream):
+            stream.close()
+            raise CancelledError(f"{self.upstream} 请求已取消")
+        parts = []
+        usage = {"prompt_tokens": 0, "completion_tokens": 0}
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,  # 这里换成了带有基于的列表
-                stream=False,
+            for chunk in stream:
+                if cancel_event.is_set():
+                    raise CancelledError(f"{self.upstream} 请求已取消")
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                if getattr(chunk, "usage", None) is not None:
+                    usage["prompt_tokens"] = chunk.usage.prompt_tokens
+                    usage["completion_tokens"] = chunk.usage.completion_tokens
+        except Exception:
+            # 连接被取消方关闭时，读取会以连接错误的形式失败
+            if cancel_event.is_set():
+                raise CancelledError(f"{self.upstream} 请求已取消") from None
+            raise
+        finally:
+            stream.close()
+        if usage["prompt_tokens"]:
+            get_limiter().settle(
+                self.upstream, estimated, usage["prompt_tokens"] + usage["completion_tokens"]
             )
-            answer = response.choices[0].message.content
+        return "".join(parts), usage
+
+    def generate(self, messages: list, step: str = "action", timeout: float | None = None) -> str:
+        """调用LLM API来生成回应。
+
+        Args:
+            messages: 对话消息列表
+            step: 步骤类型，单模型客户端忽略该参数
+            timeout: 剩余时间预算（秒），包含限流排队时间
+        """
+        print("正在调用大语言模型...")
+        try:
+            answer, _ = self.complete(messages, timeout=timeout)
+            print("大语言模型响应成功。")
+            return answer
+        except Exception as e:
+            print(f"调用LLM API时发生错误: {e}")
+            return "错误:调用语言模型服务时出错。"
+
+
+class CancelledError(Exception):
+    """请求被主动取消（如对冲请求中落败的一方）"""
+
+
+class CancelToken:
+    """
+    流式请求的取消句柄
+
+    请求方打开流后通过 attach() 登记；set() 可以在任意线程调用，
+    立即关闭已登记的流，正在阻塞读取的请求线程随之失败退出。
+    """
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def attach(self, stream) -> bool:
+        """登记已打开的流，已经被取消时返回 False"""
+        with self._lock:
+            if self._event.is_set():
+                return False
+            self._stream = stream
+            return True
+
+    def set(self) -> None:
+        with self._lock:
+            self._event.set()
+            stream, self._stream = self._stream, None
+        if stream is not None:
+            try:
+                stream.close()
+            except Exception:
+                pass
+
+
+class HedgedClient:
+    """
+    对冲请求：主端点在自适应阈值（观测到的 p95 延迟）内没有返回时，
+    向备用端点再发一份相同的请求，先返回者胜出，落败的请求被取消。
+
+    为避免对冲放大上游压力，对冲次数占总请求数的比例不超过 max_hedge_ratio。
+    complete() / generate() 的接口与 OpenAICompatibleClient 相同。
+    """
+
+    def __init__(
+        self,
+        primary: OpenAICompatibleClient,
+        secondary: OpenAICompatibleClient,
+        quantile: float = 0.95,
+        initial_delay: float = 3.0,
+        min_samples: int = 20,
+        max_hedge_ratio: float = 0.1,
+        window: int = 200,
+        max_workers: int = 16,
+    ) -> None:
+        """
+        Args:
+            primary: 主端点
+            secondary: 备用端点
+            quantile: 触发对冲的延迟分位数
+            initial_delay: 样本不足 min_samples 时使用的固定阈值（秒）
+            min_samples: 开始使用自适应阈值所需的最少样本数
+            max_hedge_ratio: 对冲请求占总请求数的比例上限
+            window: 用于计算分位数的最近延迟样本数
+            max_workers: 执行请求的线程数
+        """
+        self.primary = primary
+        self.secondary = secondary
+        self.quantile = quantile
+        self.initial_delay = initial_delay
+        self.min_samples = min_samples
+        self.max_hedge_ratio = max_hedge_ratio
+        self._latencies = deque(maxlen=window)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "hedges_fired": 0, "hedge_wins": 0, "hedges_skipped": 0}
+
+    def hedge_delay(self) -> float:
+        """当前的对冲阈值：最近延迟样本的分位数"""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            samples = sorted(self._latencies)
+        return percentile(samples, self.quantile)
+
+    def _call(self, client: OpenAICompatibleClient, messages: list, timeout: float | None, cancel_event: CancelToken) -> tuple:
+        start = time.perf_counter()
+        answer, usage = client.complete(messages, timeout=timeout, cancel_event=cancel_event)
+        return answer, usage, time.perf_counter() - start
+
+    def complete(self, messages: list, timeout: float | None = None) -> tuple[str, dict]:
+        """发送请求，必要时对冲，返回先完成的结果"""
+        delay = self.hedge_delay()
+        with self._lock:
+            self.counters["requests"] += 1
+        if timeout is not None:
+            delay = min(delay, timeout)
+
+        primary_cancel = CancelToken()
+        start = time.perf_counter()
+        primary = self._executor.submit(self._call, self.primary, messages, timeout, primary_cancel)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return self._finish(primary)
+
+        with self._lock:
+            allowed = self.counters["hedges_fired"] < self.max_hedge_ratio * self.counters["requests"]
+            if allowed:
+                self.counters["hedges_fired"] += 1
+            else:
+                self.counters["hedges_skipped"] += 1
+        if not allowed:
+            return self._finish(primary)
+
+        remaining = None if timeout is None else max(0.0, timeout - delay)
+        secondary_cancel = CancelToken()
+        secondary = self._executor.submit(self._call, self.secondary, messages, remaining, secondary_cancel)
+        pending = {primary: primary_cancel, secondary: secondary_cancel}
+        error = None
+        while pending:
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.pop(future)
+                if future.exception() is not None:
+                    error = future.exception()
+                    continue
+                # 胜出：取消另一方
+                for loser, cancel_event in pending.items():
+                    cancel_event.set()
+                    loser.cancel()
+                if future is secondary:
+                    # 主端点没有完成，以它已经等待的时间（不少于阈值）作为延迟样本；
+                    # 只记录备用端点的延迟会让阈值越来越低，对冲越来越频繁
+                    with self._lock:
+                        self.counters["hedge_wins"] += 1
+                        if primary in pending:
+                            self._latencies.append(max(delay, time.perf_counter() - start))
+                    answer, usage, _ = future.result()
+                    return answer, usage
+                return self._finish(future)
+        raise error
+
+    def _finish(self, future) -> tuple[str, dict]:
+        answer, usage, latency = future.result()
+        with self._lock:
+            self._latencies.append(latency)
+        return answer, usage
+
+    def generate(self, messages: list, step: str = "action", timeout: float | None = None) -> str:
+        """调用LLM API来生成回应（对冲模式）"""
+        print("正在调用大语言模型...")
+        try:
+            answer, _ = self.complete(messages, timeout=timeout)
             print("大语言模型响应成功。")
             return answer
         except Exception as e:
             print(f"调用LLM API时发生错误: {e}")
             return "错误:调用语言模型服务时出错。"
+
+    def stats(self) -> dict:
+        """对冲计数及当前阈值"""
+        with self._lock:
+            counters = dict(self.counters)
+        counters["hedge_delay"] = self.hedge_delay()
+        return counters
+
+
+class ModelRouter:
+    """
+    按步骤类型在多个模型档位之间路由
+
+    - 中间步骤（action：选工具、填参数）交给更快/更便宜的模型
+    - 最终答案（final）交给更强的模型
+    - 某一档调用失败或超过延迟 SLO 时，依次回退到下一档
+
+    generate() 的接口与 OpenAICompatibleClient 相同，可以直接替换 ReactAgent.model。
+    """
+
+    def __init__(
+        self,
+        tiers: dict,
+        routes: dict,
+        latency_slo: dict | None = None,
+    ) -> None:
+        """
+        Args:
+            tiers: 档位名 -> OpenAICompatibleClient，如 {"fast": ..., "strong": ...}
+            routes: 步骤类型 -> 按优先级排列的档位名列表，"default" 用于未列出的步骤，
+                如 {"action": ["fast", "strong"], "final": ["strong", "fast"]}
+            latency_slo: 档位名 -> 延迟上限（秒），超时即回退到下一档
+        """
+        self.tiers = tiers
+        self.routes = routes
+        self.latency_slo = latency_slo or {}
+        self._lock = threading.Lock()
+        self._stats = {
+            name: {
+                "calls": 0,
+                "failures": 0,
+                "slo_breaches": 0,
+                "total_latency": 0.0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+            }
+            for name in tiers
+        }
+
+    def has_route(self, step: str) -> bool:
+        """是否为该步骤类型单独配置了路由"""
+        return step in self.routes
+
+    def generate(self, messages: list, step: str = "action", timeout: float | None = None) -> str:
+        """按步骤类型选择模型档位生成回应，失败时回退
+
+        Args:
+            messages: 对话消息列表
+            step: 步骤类型
+            timeout: 剩余时间预算（秒），所有档位（含回退）共用
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        tier_names = self.routes.get(step) or self.routes.get("default") or list(self.tiers)
+        for name in tier_names:
+            slo = self.latency_slo.get(name)
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                slo = remaining if slo is None else min(slo, remaining)
+            print(f"正在调用大语言模型（{name}）...")
+            start = time.perf_counter()
+            try:
+                answer, usage = self.tiers[name].complete(messages, timeout=slo)
+            except Exception as e:
+                self._record(name, time.perf_counter() - start, failed=True, slo=slo)
+                print(f"调用 {name} 档模型时发生错误，尝试下一档: {e}")
+                continue
+            self._record(name, time.perf_counter() - start, usage=usage, slo=slo)
+            print("大语言模型响应成功。")
+            return answer
+        return "错误:调用语言模型服务时出错。"
+
+    def _record(self, name: str, latency: float, usage: dict | None = None, failed: bool = False, slo: float | None = None) -> None:
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["total_latency"] += latency
+            if failed:
+                stats["failures"] += 1
+            if slo is not None and latency > slo:
+                stats["slo_breaches"] += 1
+            if usage:
+                stats["prompt_tokens"] += usage["prompt_tokens"]
+                stats["completion_tokens"] += usage["completion_tokens"]
+
+    def stats(self) -> dict:
+        """各档位的调用次数、平均延迟（秒）和 token 用量"""
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "avg_latency": stats["total_latency"] / stats["calls"] if stats["calls"] else 0.0,
+                }
+                for name, stats in self._stats.items()
+            }
@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import random
+import resource
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from agent import ReactAgent
+from metrics import percentile
+
+
+def parse_profile(spec: str):
+    """解析延迟配置，返回每次调用生成延迟（秒）的函数
+
+    支持：none、fixed:0.5、uniform:0.2,1.0、lognormal:mu,sigma
+    """
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",") if v]
+    if kind == "none":
+        return lambda: 0.0
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(values[0], values[1])
+    raise ValueError(f"未知的延迟配置: {spec}")
+
+
+class StubLLM:
+    """本地桩 LLM：按延迟配置睡眠，先调用 tool_calls 次工具，然后给出最终答案"""
+
+    def __init__(self, latency, tool_calls: int = 1) -> None:
+        self.latency = latency
+        self.tool_calls = tool_calls
+
+    def generate(self, messages: list, step: str = "action", timeout: float | None = None) -> str:
+        delay = self.latency()
+        time.sleep(delay if timeout is None else min(delay, timeout))
+        observations = sum(1 for m in messages if m["content"].startswith("观察："))
+        if observations < self.tool_calls and step != "final":
+            return '思考：需要先查询天气\n行动：get_weather\n行动输入：{"city": "上海"}'
+        return "思考：信息已足够\n最终答案：这是桩模型给出的答案。"
+
+
+def make_stub_tool(latency):
+    def stub_tool(timeout: float = 10.0, **kwargs) -> str:
+        time.sleep(min(latency(), timeout))
+        return "上海当前天气:晴，气温25摄氏度"
+
+    return stub_tool
+
+
+def is_failed_answer(answer: str) -> bool:
+    """LLM 调用失败返回的错误信息和超出时间预算的部分答案都算失败"""
+    return answer.startswith("错误") or answer.startswith("（部分答案")
+
+
+def load_corpus(path: str) -> list:
+    """读取查询语料：JSONL（取 query 字段）或纯文本（每行一条）"""
+    queries = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            queries.append(json.loads(line)["query"] if line.startswith("{") else line)
+    return queries
+
+
+def current_rss_mb() -> float:
+    """当前常驻内存（MB），读取 /proc，不可用时退回历史峰值"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def build_agent(args) -> ReactAgent:
+    """按命令行参数创建 Agent：--stub 时替换为桩 LLM 和桩工具"""
+    if args.stub:
+        agent = ReactAgent(api_key="stub", url="http://127.0.0.1/v1")
+        agent.model = StubLLM(parse_profile(args.llm_latency), args.tool_calls)
+        for name in agent.tools._tools_map:
+            agent.tools._tools_map[name] = make_stub_tool(parse_profile(args.tool_latency))
+        # 桩工具的结果不能写入本机共享的工具缓存
+        agent.tools.shared_cache = None
+        return agent
+    return ReactAgent(api_key=os.getenv("DEEPSEEK_API_KEY"), url="https://api.deepseek.com/v1")
+
+
+class InProcessTarget:
+    """在当前进程内运行 ReactAgent，每个线程一个 Agent 实例（Agent 的运行状态不是线程安全的）"""
+
+    def __init__(self, args) -> None:
+        self.args = args
+        self._local = threading.local()
+
+    def _agent(self) -> ReactAgent:
+        agent = getattr(self._local, "agent", None)
+        if agent is None:
+            agent = build_agent(self.args)
+            self._local.agent = agent
+        return agent
+
+    def __call__(self, query: str) -> str:
+        return self._agent().run(query, max_iterations=self.args.max_iterations, verbose=False)
+
+
+class HttpTarget:
+    """服务模式：POST {"query": ...} 到指定地址，返回 JSON 中的 answer 字段"""
+
+    def __init__(self, url: str, timeout: float) -> None:
+        self.url = url
+        self.timeout = timeout
+
+    def __call__(self, query: str) -> str:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"query": query}, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())["answer"]
+
+
+def run_level(target, queries: list, concurrency: int, requests: int) -> dict:
+    """以给定并发数发送 requests 个请求，返回该档位的统计"""
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i: int) -> None:
+        nonlocal errors
+        start = time.perf_counter()
+        try:
+            answer = target(queries[i % len(queries)])
+            failed = is_failed_answer(answer)
+        except Exception:
+            failed = True
+        elapsed = time.perf_counter() - start
+        with lock:
+            latencies.append(elapsed)
+            errors += failed
+
+    cpu_start = os.times()
+    wall_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - wall_start
+    cpu_end = os.times()
+
+    latencies.sort()
+    cpu_seconds = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system)
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": errors / requests if requests else 0.0,
+        "throughput_rps": requests / wall if wall else 0.0,
+        "latency_s": {
+            "mean": sum(latencies) / len(latencies) if latencies else 0.0,
+            "p50": percentile(latencies, 0.50),
+            "p90": percentile(latencies, 0.90),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1] if latencies else 0.0,
+        },
+        "cpu_percent": 100.0 * cpu_seconds / wall if wall else 0.0,
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="ReactAgent 压测：按并发档位扫描吞吐、延迟分位数、错误率和资源占用")
+    parser.add_argument("--corpus", required=True, help="查询语料，JSONL（query 字段）或纯文本")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="逗号分隔的并发档位")
+    parser.add_argument("--requests", type=int, default=50, help="每个档位发送的请求数")
+    parser.add_argument("--max-iterations", type=int, default=3, help="Agent 最大迭代次数")
+    parser.add_argument("--url", help="服务模式地址，指定后通过 HTTP 压测而不是进程内调用")
+    parser.add_argument("--http-timeout", type=float, default=120.0, help="服务模式单次请求超时（秒）")
+    parser.add_argument("--stub", action="store_true", help="使用本地桩 LLM 和桩工具，不访问外部服务")
+    parser.add_argument("--llm-latency", default="lognormal:-0.7,0.5", help="桩 LLM 的延迟配置")
+    parser.add_argument("--tool-latency", default="uniform:0.1,0.5", help="桩工具的延迟配置")
+    parser.add_argument("--tool-calls", type=int, default=1, help="桩 LLM 每个问题调用工具的次数")
+    parser.add_argument("--seed", type=int, default=None, help="延迟配置使用的随机种子")
+    parser.add_argument("--output", default="loadtest_report.json", help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    load_dotenv()
+    if args.seed is not None:
+        random.seed(args.seed)
+    queries = load_corpus(args.corpus)
+    target = HttpTarget(args.url, args.http_timeout) if args.url else InProcessTarget(args)
+
+    levels = []
+    for concurrency in [int(c) for c in args.concurrency.split(",")]:
+        result = run_level(target, queries, concurrency, args.requests)
+        levels.append(result)
+        latency = result["latency_s"]
+        print(
+            f"并发 {concurrency:>4} | 吞吐 {result['throughput_rps']:7.2f} req/s | "
+            f"p50 {latency['p50']:6.2f}s p95 {latency['p95']:6.2f}s p99 {latency['p99']:6.2f}s | "
+            f"错误率 {result['error_rate']:.1%} | CPU {result['cpu_percent']:5.1f}% | RSS {result['rss_mb']:.1f}MB"
+        )
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime()),
+        "mode": "http" if args.url else ("stub" if args.stub else "in-process"),
+        "config": vars(args),
+        "levels": levels,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"报告已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
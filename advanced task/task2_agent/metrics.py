@@ -0,0 +1,9 @@
+import math
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """最近秩法计算分位数：第 ceil(q * n) 个值，空列表返回 0.0"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, min(len(sorted_values) - 1, math.ceil(q * len(sorted_values)) - 1))
+    return sorted_values[index]
@@ -0,0 +1,167 @@
+import re
+import time
+import json5
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Callable
+
+# 参数中引用前序步骤结果的占位符，如 {{s1}}
+_REF_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+# 代入到下游参数中的前序结果最多保留的字符数
+MAX_REF_CHARS = 200
+
+
+class PlanError(ValueError):
+    """计划无法解析或不是合法的有向无环图"""
+
+
+@dataclass
+class PlanStep:
+    id: str
+    tool: str
+    args: dict
+    depends_on: list = field(default_factory=list)
+
+
+def build_plan_prompt(tool_descriptions: str, now: str) -> str:
+    """构建规划模式的系统提示"""
+    return f"""现在时间是 {now}。你是一位智能助手，需要先为用户的问题制定完整的工具调用计划。可以使用以下工具：
+
+{tool_descriptions}
+
+请只输出一个 JSON 对象，格式如下：
+{{"steps": [
+  {{"id": "s1", "tool": "get_weather", "args": {{"city": "上海"}}, "depends_on": []}},
+  {{"id": "s2", "tool": "google_search", "args": {{"search_query": "上海 {{{{s1}}}} 适合去的景点"}}, "depends_on": ["s1"]}}
+]}}
+
+规则：
+- 互不依赖的步骤不要写依赖，它们会并行执行
+- 参数中可以用 {{{{步骤id}}}} 引用前序步骤的结果，被引用的步骤必须写在 depends_on 中
+- 不需要工具就能回答时，输出 {{"steps": []}}
+- 步骤尽量少，不要超过 6 步"""
+
+
+def parse_plan(text: str, tool_names) -> list:
+    """解析模型输出的计划，校验工具名、依赖关系并检测环
+
+    Returns:
+        按拓扑顺序排列的 PlanStep 列表
+
+    Raises:
+        PlanError: 计划不合法
+    """
+    start, end = text.find("{"), text.rfind("}")
+    if start < 0 or end <= start:
+        raise PlanError("未找到 JSON 计划")
+    try:
+        data = json5.loads(text[start : end + 1])
+    except ValueError as e:
+        raise PlanError(f"计划不是合法的 JSON: {e}") from e
+    raw_steps = data.get("steps") if isinstance(data, dict) else None
+    if not isinstance(raw_steps, list):
+        raise PlanError("计划缺少 steps 列表")
+
+    steps = {}
+    for raw in raw_steps:
+        if not isinstance(raw, dict) or not raw.get("id") or not raw.get("tool"):
+            raise PlanError(f"步骤格式错误: {raw}")
+        step_id = str(raw["id"])
+        if step_id in steps:
+            raise PlanError(f"步骤 id 重复: {step_id}")
+        if raw["tool"] not in tool_names:
+            raise PlanError(f"步骤 {step_id} 使用了未知工具: {raw['tool']}")
+        args = raw.get("args") or {}
+        if not isinstance(args, dict):
+            raise PlanError(f"步骤 {step_id} 的 args 不是对象")
+        # 参数中引用到的步骤即使没写在 depends_on 里也视为依赖
+        depends_on = [str(d) for d in raw.get("depends_on") or []]
+        for value in args.values():
+            for ref in _REF_PATTERN.findall(str(value)):
+                if ref not in depends_on:
+                    depends_on.append(ref)
+        steps[step_id] = PlanStep(step_id, raw["tool"], args, depends_on)
+
+    for step in steps.values():
+        for dep in step.depends_on:
+            if dep not in steps:
+                raise PlanError(f"步骤 {step.id} 依赖了不存在的步骤: {dep}")
+
+    # Kahn 拓扑排序，排不完说明有环
+    indegree = {step_id: len(step.depends_on) for step_id, step in steps.items()}
+    ordered = []
+    ready = [step_id for step_id, degree in indegree.items() if degree == 0]
+    while ready:
+        step_id = ready.pop(0)
+        ordered.append(steps[step_id])
+        for other in steps.values():
+            if step_id in other.depends_on:
+                indegree[other.id] -= 1
+                if indegree[other.id] == 0:
+                    ready.append(other.id)
+    if len(ordered) != len(steps):
+        cyclic = sorted(step_id for step_id, degree in indegree.items() if degree > 0)
+        raise PlanError(f"计划存在循环依赖: {', '.join(cyclic)}")
+    return ordered
+
+
+def resolve_args(args: dict, results: dict) -> dict:
+    """把参数中的 {{步骤id}} 替换为该步骤的结果（截断到 MAX_REF_CHARS 个字符）"""
+
+    def substitute(match):
+        return str(results.get(match.group(1), ""))[:MAX_REF_CHARS]
+
+    return {
+        key: _REF_PATTERN.sub(substitute, value) if isinstance(value, str) else value
+        for key, value in args.items()
+    }
+
+
+def execute_plan(
+    steps: list,
+    execute: Callable[[str, dict], str],
+    max_workers: int = 4,
+    timeout: float | None = None,
+) -> dict:
+    """按依赖关系执行计划：互不依赖的步骤并行，依赖的输入全部就绪后立即开始
+
+    Args:
+        steps: parse_plan 返回的步骤列表
+        execute: 执行单个工具的函数 (工具名, 参数) -> 结果文本
+        max_workers: 最大并行数
+        timeout: 整个计划的时间预算（秒），用完后未完成的步骤记为超时
+
+    Returns:
+        步骤 id -> 结果文本
+    """
+    results = {}
+    pending = {step.id: step for step in steps}
+    running = {}
+    deadline = None if timeout is None else time.monotonic() + timeout
+    # 不使用 with：超时返回时不能等待仍在运行的工具结束
+    pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="plan")
+    try:
+        while pending or running:
+            for step_id, step in list(pending.items()):
+                if all(dep in results for dep in step.depends_on):
+                    del pending[step_id]
+                    args = resolve_args(step.args, results)
+                    running[pool.submit(execute, step.tool, args)] = step_id
+            if not running:
+                break
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(running, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                # 时间预算用完：不再等待，剩下的步骤都记为超时
+                for step_id in list(running.values()) + list(pending):
+                    results[step_id] = "错误：步骤未在时间预算内完成"
+                break
+            for future in done:
+                step_id = running.pop(future)
+                try:
+                    results[step_id] = future.result()
+                except Exception as e:
+                    results[step_id] = f"错误：执行步骤 {step_id} 时出错: {e}"
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return results
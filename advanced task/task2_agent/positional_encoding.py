@@ -0,0 +1,85 @@
+import os
+import threading
+import numpy as np
+
+# 缓存：(d_model, dtype) -> 目前算过的最长编码表
+# 请求更短的 max_len 时直接返回切片视图，请求更长时只补算新增的行
+_PE_CACHE: dict = {}
+_PE_LOCK = threading.Lock()
+
+
+def _div_term(d_model: int) -> np.ndarray:
+    """每对 sin/cos 维度的频率：1 / 10000^(2i / d_model)"""
+    return np.exp(np.arange(0, d_model, 2, dtype=np.float64) * (-np.log(10000.0) / d_model))
+
+
+def _fill_rows(table: np.ndarray, start: int, stop: int, d_model: int) -> None:
+    """一次性向量化计算 [start, stop) 行，写入 table 对应位置"""
+    positions = np.arange(start, stop, dtype=np.float64)[:, None]
+    angles = positions * _div_term(d_model)[None, :]
+    table[start:stop, 0::2] = np.sin(angles)
+    # d_model 为奇数时 cos 列比 sin 列少一列
+    table[start:stop, 1::2] = np.cos(angles[:, : d_model // 2])
+
+
+def _allocate(max_len: int, d_model: int, dtype, mmap_dir: str | None) -> np.ndarray:
+    """分配编码表，指定 mmap_dir 时使用磁盘上的 .npy 内存映射文件"""
+    if mmap_dir is None:
+        return np.empty((max_len, d_model), dtype=dtype)
+    os.makedirs(mmap_dir, exist_ok=True)
+    path = os.path.join(
+        mmap_dir, f"pe_{max_len}x{d_model}_{np.dtype(dtype).name}.npy"
+    )
+    return np.lib.format.open_memmap(
+        path, mode="w+", dtype=dtype, shape=(max_len, d_model)
+    )
+
+
+def positional_encoding(
+    max_len: int,
+    d_model: int,
+    dtype=np.float32,
+    mmap_dir: str | None = None,
+    mmap_threshold: int = 256 * 1024 * 1024,
+) -> np.ndarray:
+    """生成 max_len x d_model 的正弦位置编码表
+
+    Args:
+        max_len: 最大序列长度
+        d_model: 编码维度
+        dtype: 输出类型，默认 float32
+        mmap_dir: 内存映射文件所在目录，不指定则全部放在内存中
+        mmap_threshold: 表大小（字节）超过该值且指定了 mmap_dir 时才使用内存映射
+
+    Returns:
+        只读的编码表（缓存中的表或其切片视图），偶数列为 sin，奇数列为 cos
+    """
+    if max_len <= 0 or d_model <= 0:
+        raise ValueError("max_len 和 d_model 必须为正整数")
+    dtype = np.dtype(dtype)
+    key = (d_model, dtype)
+
+    with _PE_LOCK:
+        cached = _PE_CACHE.get(key)
+        if cached is not None and cached.shape[0] >= max_len:
+            return cached[:max_len]
+
+        use_mmap = mmap_dir is not None and max_len * d_model * dtype.itemsize >= mmap_threshold
+        table = _allocate(max_len, d_model, dtype, mmap_dir if use_mmap else None)
+
+        # 已有较短的表时只补算新增的行
+        start = 0
+        if cached is not None:
+            start = cached.shape[0]
+            table[:start] = cached
+        _fill_rows(table, start, max_len, d_model)
+
+        table.flags.writeable = False
+        _PE_CACHE[key] = table
+        return table
+
+
+def clear_cache() -> None:
+    """清空编码表缓存"""
+    with _PE_LOCK:
+        _PE_CACHE.clear()
@@ -0,0 +1,122 @@
+import contextlib
+import linecache
+import tracemalloc
+
+# 报告中保留的热点分配位置条数
+TOP_SITES = 10
+
+
+class StepProfiler:
+    """
+    基于 tracemalloc 的分阶段内存分析
+
+    每个阶段（prompt 构建、LLM 响应、解析、工具、历史追加）前后读取 tracemalloc 的
+    当前用量并重置峰值，累计该阶段新分配的字节数、净增长和峰值；
+    trace_sites=True 时再在阶段前后各拍一次快照，按代码行统计分配热点（开销较大）。
+
+    tracemalloc 是进程级的，同一进程内并发运行的多个 Agent 会互相计入，分析时请单线程运行。
+    """
+
+    def __init__(self, trace_sites: bool = False, frames: int = 1) -> None:
+        self.trace_sites = trace_sites
+        self.frames = frames
+        self._owns_tracing = False
+        self._run_start = 0
+        self._run_peak = 0
+        self.phases: dict = {}
+        self.sites: dict = {}  # 阶段 -> {"文件:行号": 字节数}
+
+    def start(self) -> None:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.frames)
+            self._owns_tracing = True
+        tracemalloc.reset_peak()
+        self._run_start, _ = tracemalloc.get_traced_memory()
+        self._run_peak = self._run_start
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        """统计一个阶段的内存分配"""
+        before = tracemalloc.take_snapshot() if self.trace_sites else None
+        start, peak_so_far = tracemalloc.get_traced_memory()
+        self._run_peak = max(self._run_peak, peak_so_far)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            current, peak = tracemalloc.get_traced_memory()
+            self._run_peak = max(self._run_peak, peak)
+            stats = self.phases.setdefault(
+                name, {"calls": 0, "allocated_bytes": 0, "net_bytes": 0, "peak_bytes": 0}
+            )
+            stats["calls"] += 1
+            # 每次调用期间高出起点的峰值之和，近似该阶段分配的字节数（临时对象也会计入）
+            stats["allocated_bytes"] += peak - start
+            stats["net_bytes"] += current - start
+            stats["peak_bytes"] = max(stats["peak_bytes"], peak - start)
+            if before is not None:
+                self._record_sites(name, before, tracemalloc.take_snapshot())
+
+    def _record_sites(self, name: str, before, after) -> None:
+        # 排除 tracemalloc 拍快照和分析器自身记账产生的分配
+        exclude = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        after = after.filter_traces(exclude)
+        before = before.filter_traces(exclude)
+        sites = self.sites.setdefault(name, {})
+        for diff in after.compare_to(before, "lineno"):
+            if diff.size_diff <= 0:
+                continue
+            frame = diff.traceback[0]
+            key = f"{frame.filename}:{frame.lineno}"
+            sites[key] = sites.get(key, 0) + diff.size_diff
+
+    def stop(self) -> dict:
+        """结束分析并返回报告"""
+        current, peak = tracemalloc.get_traced_memory()
+        self._run_peak = max(self._run_peak, peak)
+        if self._owns_tracing:
+            tracemalloc.stop()
+            self._owns_tracing = False
+        report = {
+            "net_bytes": current - self._run_start,
+            "peak_bytes": self._run_peak - self._run_start,
+            "phases": self.phases,
+        }
+        if self.trace_sites:
+            report["top_sites"] = {
+                name: sorted(sites.items(), key=lambda item: item[1], reverse=True)[:TOP_SITES]
+                for name, sites in self.sites.items()
+            }
+        return report
+
+
+class _NullProfiler:
+    """未开启分析时使用，phase() 不做任何事"""
+
+    def phase(self, name: str):
+        return contextlib.nullcontext()
+
+
+NULL_PROFILER = _NullProfiler()
+
+
+def format_report(report: dict) -> str:
+    """把 StepProfiler.stop() 的报告格式化为文本表格"""
+    lines = [
+        f"内存分析：本次运行净增 {report['net_bytes'] / 1024:.1f} KB，峰值 {report['peak_bytes'] / 1024:.1f} KB",
+        f"{'阶段':<10}{'次数':>6}{'分配(KB)':>12}{'净增(KB)':>12}{'峰值(KB)':>12}",
+    ]
+    for name, stats in sorted(
+        report["phases"].items(), key=lambda item: item[1]["allocated_bytes"], reverse=True
+    ):
+        lines.append(
+            f"{name:<10}{stats['calls']:>6}{stats['allocated_bytes'] / 1024:>12.1f}"
+            f"{stats['net_bytes'] / 1024:>12.1f}{stats['peak_bytes'] / 1024:>12.1f}"
+        )
+    for name, sites in report.get("top_sites", {}).items():
+        lines.append(f"[{name}] 分配热点：")
+        for site, size in sites:
+            filename, _, lineno = site.rpartition(":")
+            code = linecache.getline(filename, int(lineno)).strip()
+            lines.append(f"  {size / 1024:8.1f} KB  {site}  {code}")
+    return "\n".join(lines)
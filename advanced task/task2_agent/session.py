@@ -0,0 +1,89 @@
+import sys
+import threading
+
+# 每种 Agent 配置共享一份系统提示：配置键 -> 提示字符串
+_SHARED_PROMPTS: dict = {}
+_SHARED_LOCK = threading.Lock()
+
+
+def shared_prompt(config_key, prompt: str) -> str:
+    """返回该配置下共享的系统提示对象
+
+    内容相同则复用已有的字符串对象，不同（如时间戳变化）则替换为新内容，
+    每种配置只保留一份。
+    """
+    with _SHARED_LOCK:
+        existing = _SHARED_PROMPTS.get(config_key)
+        if existing == prompt:
+            return existing
+        _SHARED_PROMPTS[config_key] = prompt
+        return prompt
+
+
+def _is_shared(text: str) -> bool:
+    with _SHARED_LOCK:
+        return any(text is prompt for prompt in _SHARED_PROMPTS.values())
+
+
+class Message:
+    """一条对话消息，使用 __slots__ 代替 dict 以减少每条消息的内存开销"""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str) -> None:
+        # 角色只有少数几种取值，驻留后所有消息共用同一个字符串
+        self.role = sys.intern(role)
+        self.content = content
+
+    def to_dict(self) -> dict:
+        return {"role": self.role, "content": self.content}
+
+
+class SessionHistory:
+    """
+    紧凑的会话历史
+
+    消息以 Message 记录保存，系统提示引用共享对象而不是各自持有一份；
+    调用 LLM 接口时再通过 to_messages() 临时转换为 dict 列表。
+    """
+
+    __slots__ = ("_messages",)
+
+    def __init__(self, messages: list | None = None) -> None:
+        self._messages = [Message(m["role"], m["content"]) for m in messages or []]
+
+    def append(self, role: str, content: str) -> None:
+        self._messages.append(Message(role, content))
+
+    def pop(self) -> Message:
+        return self._messages.pop()
+
+    def set_system(self, content: str) -> None:
+        """替换系统提示（第一条消息）"""
+        self._messages[0].content = content
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __getitem__(self, index) -> Message:
+        return self._messages[index]
+
+    def to_messages(self, start: int = 0) -> list:
+        """转换为 OpenAI 接口使用的 dict 列表，start 为起始下标（可为负数）"""
+        return [m.to_dict() for m in self._messages[start:]]
+
+    def memory_usage(self) -> dict:
+        """估算会话占用的内存（字节）
+
+        Returns:
+            {"messages": 消息数, "bytes": 会话独占的字节数, "shared_bytes": 引用的共享系统提示字节数}
+        """
+        own = sys.getsizeof(self) + sys.getsizeof(self._messages)
+        shared = 0
+        for message in self._messages:
+            own += sys.getsizeof(message)
+            if _is_shared(message.content):
+                shared += sys.getsizeof(message.content)
+            else:
+                own += sys.getsizeof(message.content)
+        return {"messages": len(self._messages), "bytes": own, "shared_bytes": shared}
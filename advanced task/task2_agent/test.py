@@ -1,24 +1,18 @@
-import torch
-import matplotlib.pyplot as plt
-import numpy as np
+from positional_encoding import positional_encoding
 
 
-def frequency_demo():
-    max_len = 500  # 假设句子长 500 个词
-    d_model = 128
-    positions = np.arange(max_len)
+def frequency_demo(max_len: int = 500, d_model: int = 128, dims=(0, 100)):
+    """画出编码表中指定维度随位置变化的曲线（需要 matplotlib）"""
+    # 绘图是可选的，只在调用时才导入 matplotlib
+    import matplotlib.pyplot as plt
 
-    # 维度 0 (i=0): 频率最高
-    dim_0_freq = 1.0 / (10000 ** (0 / d_model))
-    # 维度 100 (i=50): 频率较低
-    dim_100_freq = 1.0 / (10000 ** (100 / d_model))
-
-    pe_0 = np.sin(positions * dim_0_freq)
-    pe_100 = np.sin(positions * dim_100_freq)
+    # 假设句子长 500 个词，一次性生成完整编码表
+    pe = positional_encoding(max_len, d_model)
 
     plt.figure(figsize=(10, 4))
-    plt.plot(positions, pe_0, label="Dimension 0 (High Freq)", color="blue")
-    plt.plot(positions, pe_100, label="Dimension 100 (Low Freq)", color="red")
+    # 维度 0 (i=0): 频率最高；维度 100 (i=50): 频率较低
+    for dim in dims:
+        plt.plot(pe[:, dim], label=f"Dimension {dim}")
     plt.title("Frequency difference within a single word vector")
     plt.xlabel("Position in sentence")
     plt.ylabel("Value added to embedding")
@@ -26,4 +20,5 @@ def frequency_demo():
     plt.show()
 
 
-frequency_demo()
+if __name__ == "__main__":
+    frequency_demo()
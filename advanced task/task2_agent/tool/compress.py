@@ -0,0 +1,94 @@
+import re
+
+# 中日韩字符大致一个字一个 token，其余字符约 4 个字符一个 token
+_CJK_PATTERN = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯]")
+_SENTENCE_PATTERN = re.compile(r"[^。！？!?；;]+?(?:[。！？!?；;]+|\.(?=\s)|$)")
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+COMPRESSED_NOTE = "（结果已按相关性精简）"
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数，不依赖分词器"""
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def _features(text: str) -> set:
+    """提取用于相关性打分的特征：英文单词 + 中文字的二元组"""
+    text = text.lower()
+    features = set(_WORD_PATTERN.findall(text))
+    cjk = "".join(_CJK_PATTERN.findall(text))
+    features.update(cjk[i : i + 2] for i in range(len(cjk) - 1))
+    features.update(cjk)
+    return features
+
+
+def _truncate(text: str, budget: int) -> str:
+    """按 token 预算截断单个过长的句子"""
+    kept = []
+    used = 0
+    for char in text:
+        used += 1 if _CJK_PATTERN.match(char) else 0.25
+        if used > budget:
+            break
+        kept.append(char)
+    return "".join(kept) + "……"
+
+
+def compress_observation(text: str, query: str, budget: int) -> str:
+    """对超出预算的工具结果做本地抽取式压缩
+
+    - 按行、按句切分，去掉重复句子
+    - 按与查询的特征重合度给句子打分，分数相同时靠前的优先
+    - 在预算内保留高分句子，并按原文顺序输出
+
+    Args:
+        text: 工具返回的原始结果
+        query: 本次调用的查询（工具参数），用于相关性打分
+        budget: token 预算
+
+    Returns:
+        不超过预算（附带说明除外）的结果文本；未超预算时原样返回
+    """
+    if budget <= 0 or estimate_tokens(text) <= budget:
+        return text
+
+    query_features = _features(query)
+    sentences = []  # (行号, 句子, 原文中句子前的分隔符)
+    seen = set()
+    for line_no, line in enumerate(text.splitlines()):
+        for raw in _SENTENCE_PATTERN.findall(line):
+            sentence = raw.strip()
+            key = _NORMALIZE_PATTERN.sub("", sentence.lower())
+            if not key or key in seen:
+                continue
+            seen.add(key)
+            # 英文句子之间的空格在切分时被去掉，拼接时按原文补回
+            sentences.append((line_no, sentence, " " if raw[:1].isspace() else ""))
+
+    ranked = sorted(
+        range(len(sentences)),
+        key=lambda i: (-len(_features(sentences[i][1]) & query_features), i),
+    )
+    chosen = []
+    used = 0
+    for i in ranked:
+        cost = estimate_tokens(sentences[i][1])
+        if used + cost > budget:
+            continue
+        chosen.append(i)
+        used += cost
+
+    if not chosen:
+        # 单句就超出预算，截断最相关的一句
+        line_no, sentence, _ = sentences[ranked[0]] if sentences else (0, text, "")
+        return _truncate(sentence, budget) + COMPRESSED_NOTE
+
+    lines = {}
+    for i in sorted(chosen):
+        line_no, sentence, separator = sentences[i]
+        parts = lines.setdefault(line_no, [])
+        parts.append(separator + sentence if parts else sentence)
+    return "\n".join("".join(parts) for parts in lines.values()) + COMPRESSED_NOTE
@@ -0,0 +1,166 @@
+import importlib
+import json
+import os
+import sys
+import threading
+from concurrent.futures import (
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeout,
+)
+from typing import Callable
+
+tool_dir = os.path.dirname(os.path.abspath(__file__))
+
+
+def timeout_observation(tool_name: str, timeout: float) -> str:
+    """工具超时时返回给模型的结构化观察结果"""
+    return json.dumps(
+        {
+            "status": "timeout",
+            "tool": tool_name,
+            "timeout_s": round(timeout, 2),
+            "message": "工具执行超时，已放弃本次调用。请换一个工具或参数，或根据已有信息回答。",
+        },
+        ensure_ascii=False,
+    )
+
+
+def unavailable_observation(tool_name: str) -> str:
+    """被放弃的调用过多、工具暂时不可用时返回的结构化观察结果"""
+    return json.dumps(
+        {
+            "status": "unavailable",
+            "tool": tool_name,
+            "message": "工具上游响应异常，暂时不可用。请根据已有信息回答。",
+        },
+        ensure_ascii=False,
+    )
+
+
+class ToolExecutor:
+    """
+    带超时和取消的工具执行器
+
+    - 工具在线程池中执行，调用方最多等待 timeout 秒
+    - 超时后设置取消事件（接受 cancel_event 参数的工具可以据此提前退出），并放弃等待
+    - 仍在运行的被放弃调用数达到 max_abandoned 时，直接拒绝新的调用，
+      避免上游卡死时耗尽工作线程
+    """
+
+    def __init__(self, max_workers: int = 8, max_abandoned: int = 4) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+        self.max_abandoned = max_abandoned
+        self._abandoned = 0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "timeouts": 0, "rejected": 0}
+
+    @property
+    def abandoned(self) -> int:
+        """仍在后台运行的被放弃调用数"""
+        return self._abandoned
+
+    def _submit(self, func: Callable, kwargs: dict):
+        return self._pool.submit(func, **kwargs)
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._abandoned -= 1
+
+    def run(
+        self,
+        tool_name: str,
+        func: Callable,
+        kwargs: dict,
+        timeout: float | None,
+        accepts_cancel: bool = False,
+    ) -> str:
+        """执行工具，超时返回结构化的超时观察结果"""
+        with self._lock:
+            if self._abandoned >= self.max_abandoned:
+                self.stats["rejected"] += 1
+                return unavailable_observation(tool_name)
+            self.stats["calls"] += 1
+
+        cancel_event = threading.Event()
+        if accepts_cancel:
+            kwargs = {**kwargs, "cancel_event": cancel_event}
+        future = self._submit(func, kwargs)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            cancel_event.set()
+            with self._lock:
+                self.stats["timeouts"] += 1
+                abandoned = not future.cancel()
+                if abandoned:
+                    # 已经在运行，无法强制终止：记为被放弃，结束后自动释放名额
+                    self._abandoned += 1
+            if abandoned:
+                # 回调可能立即在当前线程执行，必须在锁外注册
+                future.add_done_callback(self._release)
+            return timeout_observation(tool_name, timeout)
+
+
+def _init_worker(modules: tuple) -> None:
+    """工作进程初始化：预先导入工具模块，首次调用不再付出导入开销"""
+    if tool_dir not in sys.path:
+        sys.path.append(tool_dir)
+    for module in modules:
+        importlib.import_module(module)
+
+
+def _call_in_worker(module: str, name: str, kwargs: dict):
+    """在工作进程中按模块名和函数名调用工具"""
+    return getattr(importlib.import_module(module), name)(**kwargs)
+
+
+def _noop() -> None:
+    return None
+
+
+class ProcessToolExecutor(ToolExecutor):
+    """
+    进程池执行器，用于持有 GIL 的 CPU 密集型工具（文档解析、相似度打分等）
+
+    - 只传递 (模块名, 函数名, 参数) 给工作进程，不序列化函数对象本身
+    - 工作进程启动时预先导入工具模块，warmup() 可以提前拉起全部进程
+    - 超时语义与 ToolExecutor 相同；进程中的调用无法协作取消，只能放弃等待
+    """
+
+    def __init__(self, modules: tuple = (), max_workers: int | None = None, max_abandoned: int = 2) -> None:
+        self._pool = ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=(tuple(modules),)
+        )
+        self._max_workers = max_workers or os.cpu_count() or 1
+        self.max_abandoned = max_abandoned
+        self._abandoned = 0
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "timeouts": 0, "rejected": 0}
+
+    def _submit(self, func: Callable, kwargs: dict):
+        return self._pool.submit(_call_in_worker, func.__module__, func.__name__, kwargs)
+
+    def warmup(self) -> None:
+        """拉起全部工作进程并完成模块导入"""
+        futures = [self._pool.submit(_noop) for _ in range(self._max_workers)]
+        for future in futures:
+            future.result()
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_PROCESS_EXECUTORS: dict = {}
+_PROCESS_EXECUTORS_LOCK = threading.Lock()
+
+
+def get_process_executor(modules: tuple) -> ProcessToolExecutor:
+    """获取进程内共享的进程池执行器，同一组工具模块只创建并预热一次"""
+    key = tuple(sorted(set(modules)))
+    with _PROCESS_EXECUTORS_LOCK:
+        executor = _PROCESS_EXECUTORS.get(key)
+        if executor is None:
+            executor = _PROCESS_EXECUTORS[key] = ProcessToolExecutor(modules=key)
+            executor.warmup()
+        return executor
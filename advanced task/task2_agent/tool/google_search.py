@@ -1,11 +1,46 @@
 import json
 import os
+import threading
+import time
 import requests
 from dotenv import load_dotenv
+from search_memory import SearchMemory
+from rate_limit import get_limiter
+from page_fetch import fetch_pages
+from shared_cache import get_shared_cache
 
+# 深度模式下抓取正文的搜索结果条数，以及每页保留的正文字符数
+DEEP_PAGES = 3
+DEEP_PAGE_CHARS = 1500
+# 原始搜索响应在多进程共享缓存中的有效期（秒）
+SEARCH_CACHE_TTL = 1800
+
+
+def google_search(
+    search_query: str,
+    memory: SearchMemory | None = None,
+    timeout: float = 10.0,
+    cancel_event: threading.Event | None = None,
+    deep: bool = False,
+    cache_ttl: float = SEARCH_CACHE_TTL,
+) -> str:
+    """执行谷歌搜索并返回格式化的结果内容
+
+    Args:
+        search_query: 搜索关键词
+        memory: 会话内的搜索记忆，传入时对近似查询和重复结果做去重
+        timeout: 本次调用的时间上限（秒），包含限流排队时间
+        cancel_event: 被设置时（调用方已放弃）不再发起请求
+        deep: 深度模式，并发抓取前几条结果的网页并提取正文，代替只有一两句的摘要
+        cache_ttl: 原始搜索响应在共享缓存中的有效期（秒），<= 0 表示不使用缓存；
+            缓存的是去重之前的响应，命中后仍按本会话的搜索记忆去重
+    """
+    started = time.monotonic()
+    if memory is not None:
+        reused = memory.find_similar(search_query)
+        if reused:
+            return reused
 
-def google_search(search_query: str) -> str:
-    """执行谷歌搜索并返回格式化的结果内容"""
     url = "https://google.serper.dev/search"
     load_dotenv()
 
@@ -19,25 +54,72 @@ def google_search(search_query: str) -> str:
     }
 
     try:
-        # 2. 发送 POST 请求
-        response = requests.post(url, headers=headers, data=payload)
-        response.raise_for_status()  # 检查请求是否成功
+        # 2. 先查共享缓存，未命中时发送 POST 请求，请求前在共享限流器中排队
+        cache = get_shared_cache() if cache_ttl > 0 else None
+        cache_args = {"q": search_query}
+        cached = cache.get("serper", cache_args) if cache is not None else None
+        if cached is not None:
+            result = json.loads(cached)
+        else:
+            waited = get_limiter().acquire("serper", max_wait=timeout)
+            if cancel_event is not None and cancel_event.is_set():
+                return "错误: 搜索已取消"
+            response = requests.post(
+                url, headers=headers, data=payload, timeout=max(0.1, timeout - waited)
+            )
+            response.raise_for_status()  # 检查请求是否成功
 
-        # 3. 解析结果
-        result = response.json()
+            # 3. 解析结果
+            result = response.json()
+            if cache is not None:
+                cache.put("serper", cache_args, json.dumps(result, ensure_ascii=False), cache_ttl)
 
         # 4. 提取关键信息并格式化
         # serper 通常返回有机搜索结果（organic）、知识图谱（knowledgeGraph）等
         search_results = []
+        search_no = memory.start_search(search_query) if memory is not None else 0
 
         # 提取知识图谱的描述（如果有）
         if "knowledgeGraph" in result:
             kg = result["knowledgeGraph"]
-            search_results.append(f"摘要: {kg.get('description', '无描述')}")
+            description = kg.get("description", "无描述")
+            reference = (
+                memory.back_reference(search_no, [description], "摘要")
+                if memory is not None
+                else ""
+            )
+            search_results.append(reference or f"摘要: {description}")
 
         # 提取前几条搜索结果的标题和摘要
+        items = []
         for item in result.get("organic", [])[:3]:  # 取前3条结果
-            search_results.append(f"标题: {item['title']}\n内容: {item['snippet']}")
+            reference = (
+                memory.back_reference(
+                    search_no, [item.get("link"), item["snippet"]], item["title"]
+                )
+                if memory is not None
+                else ""
+            )
+            items.append((item, reference))
+
+        # 深度模式：在剩余时间内并发抓取未重复结果的网页正文
+        pages = {}
+        if deep:
+            links = [item["link"] for item, reference in items if not reference and item.get("link")]
+            remaining = timeout - (time.monotonic() - started)
+            if links[:DEEP_PAGES] and remaining > 0.5:
+                pages = fetch_pages(
+                    links[:DEEP_PAGES],
+                    timeout=remaining - 0.2,
+                    max_chars=DEEP_PAGE_CHARS,
+                    cancel_event=cancel_event,
+                )
+
+        for item, reference in items:
+            content = pages.get(item.get("link")) or item["snippet"]
+            search_results.append(
+                reference or f"标题: {item['title']}\n内容: {content}"
+            )
 
         if not search_results:
             return "没有找到相关的搜索结果。"
@@ -52,12 +134,27 @@ GOOGLE_SEARCH = {
     "name_for_human": "谷歌搜索",
     "name_for_model": "google_search",
     "description_for_model": "谷歌搜索是一个通用搜索引擎，可用于访问互联网、查询百科知识、了解时事新闻等。",
+    # 执行方式：inline / thread / process，网络请求类工具使用线程池
+    "execution": "thread",
+    # 单次调用的超时时间（秒），超时后 Agent 放弃等待
+    "timeout": 15,
+    # 观察结果进入对话历史前的 token 预算
+    "observation_budget": 400,
+    # 由 ReactTools 注入会话内的搜索记忆（memory 参数）；
+    # 结果依赖会话状态，不声明 cache_ttl，原始响应在 google_search 内部按 SEARCH_CACHE_TTL 共享缓存
+    "session_memory": True,
     "parameters": [
         {
             "name": "search_query",
             "description": "搜索关键词或短语",
             "required": True,
             "schema": {"type": "string"},
-        }
+        },
+        {
+            "name": "deep",
+            "description": "是否抓取搜索结果网页的正文，摘要信息不够详细时设为 true",
+            "required": False,
+            "schema": {"type": "boolean"},
+        },
     ],
 }
@@ -0,0 +1,205 @@
+import codecs
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from html.parser import HTMLParser
+import requests
+from requests.adapters import HTTPAdapter
+
+# 每个页面最多下载的字节数和保留的正文字符数
+MAX_PAGE_BYTES = 512 * 1024
+MAX_PAGE_CHARS = 2000
+# 并发抓取的最大页面数，同时也是连接池大小
+MAX_FETCH_WORKERS = 8
+
+# 这些标签里的内容不是正文
+_SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form", "iframe"}
+# 这些标签结束时换行，避免相邻段落粘在一起
+_BLOCK_TAGS = {"p", "div", "br", "li", "tr", "section", "article", "h1", "h2", "h3", "h4", "h5", "h6", "blockquote", "pre"}
+
+
+class TextExtractor(HTMLParser):
+    """
+    边下载边解析的正文提取器
+
+    跳过脚本、样式、导航等非正文区域，按块级标签分段；
+    收集到 max_chars 个字符后置 full，调用方可以停止下载。
+    """
+
+    def __init__(self, max_chars: int = MAX_PAGE_CHARS) -> None:
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self._skip_depth = 0
+        self._parts: list = []
+        self._chars = 0
+        self.title = ""
+        self._in_title = False
+
+    @property
+    def full(self) -> bool:
+        return self._chars >= self.max_chars
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag == "title":
+            self._in_title = True
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_startendtag(self, tag, attrs):
+        if tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag == "title":
+            self._in_title = False
+        elif tag in _BLOCK_TAGS:
+            self._newline()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data.strip()
+            return
+        if self._skip_depth or self.full:
+            return
+        text = " ".join(data.split())
+        if text:
+            self._parts.append(text)
+            self._chars += len(text)
+
+    def _newline(self):
+        if self._parts and self._parts[-1] != "\n":
+            self._parts.append("\n")
+
+    def text(self) -> str:
+        lines = " ".join(self._parts).split("\n")
+        text = "\n".join(line.strip() for line in lines if line.strip())
+        return text[: self.max_chars]
+
+
+class PageCache:
+    """按 URL 缓存提取后的正文，LRU 淘汰并带过期时间"""
+
+    def __init__(self, capacity: int = 256, ttl: float = 3600.0) -> None:
+        self.capacity = capacity
+        self.ttl = ttl
+        self._items: OrderedDict = OrderedDict()  # url -> (写入时间, 正文)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, url: str) -> str | None:
+        with self._lock:
+            item = self._items.get(url)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                self._items.pop(url, None)
+                self.stats["misses"] += 1
+                return None
+            self._items.move_to_end(url)
+            self.stats["hits"] += 1
+            return item[1]
+
+    def put(self, url: str, text: str) -> None:
+        with self._lock:
+            self._items[url] = (time.monotonic(), text)
+            self._items.move_to_end(url)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+
+_page_cache = PageCache()
+_session = None
+_pool = None
+_init_lock = threading.Lock()
+
+
+def _shared():
+    """懒加载共享的连接池会话和抓取线程池"""
+    global _session, _pool
+    with _init_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_FETCH_WORKERS, pool_maxsize=MAX_FETCH_WORKERS)
+            _session.mount("http://", adapter)
+            _session.mount("https://", adapter)
+            _session.headers["User-Agent"] = "Mozilla/5.0 (compatible; ReactAgent/1.0)"
+            _pool = ThreadPoolExecutor(max_workers=MAX_FETCH_WORKERS, thread_name_prefix="fetch")
+        return _session, _pool
+
+
+def fetch_page_text(
+    url: str,
+    timeout: float = 5.0,
+    max_bytes: int = MAX_PAGE_BYTES,
+    max_chars: int = MAX_PAGE_CHARS,
+    cancel_event: threading.Event | None = None,
+) -> str:
+    """下载单个页面并提取正文，失败或不是 HTML / 文本时返回空字符串
+
+    Args:
+        url: 页面地址
+        timeout: 整个页面（连接 + 下载）的时间上限（秒）
+        max_bytes: 最多下载的字节数
+        max_chars: 最多保留的正文字符数
+        cancel_event: 被设置时停止下载
+    """
+    cached = _page_cache.get(url)
+    if cached is not None:
+        return cached
+
+    session, _ = _shared()
+    deadline = time.monotonic() + timeout
+    extractor = TextExtractor(max_chars)
+    try:
+        with session.get(url, timeout=(min(3.0, timeout), timeout), stream=True) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("Content-Type", "")
+            if content_type and "html" not in content_type and "text" not in content_type:
+                return ""
+            # 响应头没有声明编码时 requests 会退回 ISO-8859-1，中文页面按 UTF-8 解码
+            encoding = response.encoding if "charset" in content_type.lower() else "utf-8"
+            decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+            received = 0
+            interrupted = False
+            for chunk in response.iter_content(chunk_size=16 * 1024):
+                received += len(chunk)
+                extractor.feed(decoder.decode(chunk))
+                if extractor.full or received >= max_bytes:
+                    break
+                if time.monotonic() >= deadline or (cancel_event is not None and cancel_event.is_set()):
+                    interrupted = True
+                    break
+    except (requests.RequestException, LookupError):
+        return ""
+    text = extractor.text()
+    # 因超时或取消而中断的页面不完整，不写入缓存
+    if text and not interrupted:
+        _page_cache.put(url, text)
+    return text
+
+
+def fetch_pages(
+    urls: list,
+    timeout: float = 5.0,
+    max_chars: int = MAX_PAGE_CHARS,
+    cancel_event: threading.Event | None = None,
+) -> dict:
+    """并发抓取多个页面的正文
+
+    Returns:
+        url -> 正文，超时或失败的页面不在结果中
+    """
+    _, pool = _shared()
+    futures = {
+        pool.submit(fetch_page_text, url, timeout, MAX_PAGE_BYTES, max_chars, cancel_event): url
+        for url in dict.fromkeys(urls)
+    }
+    done, _ = wait(futures, timeout=timeout)
+    return {
+        futures[future]: future.result()
+        for future in done
+        if not future.exception() and future.result()
+    }
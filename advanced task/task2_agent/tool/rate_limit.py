@@ -0,0 +1,167 @@
+import asyncio
+import os
+import threading
+import time
+
+
+class RateLimitTimeout(TimeoutError):
+    """排队等待时间超过调用方允许的上限"""
+
+
+class TokenBucket:
+    """
+    预约式令牌桶
+
+    每次调用先预约令牌（余额可以为负），返回需要等待的时间后再在锁外睡眠。
+    后到的调用看到的欠额更大、等待更久，因此天然按到达顺序公平调度，
+    线程和 asyncio 协程共用同一个桶也不会互相阻塞。
+    """
+
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate = rate  # 每秒补充的令牌数
+        self.capacity = capacity  # 桶容量，即允许的突发量
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float) -> float:
+        """预约 amount 个令牌，返回需要等待的秒数"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= amount
+            return max(0.0, -self._tokens / self.rate)
+
+    def refund(self, amount: float) -> None:
+        """归还令牌（取消预约或实际用量少于预估时）"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + amount)
+
+
+class RateLimiter:
+    """
+    进程级限流器，按上游（deepseek、serper、wttr 等）分别限制：
+
+    - rps: 每秒请求数
+    - tpm: 每分钟 token 数（只对 LLM 有意义）
+
+    未配置的上游不限流。配置可以通过 configure() 设置，
+    也可以通过环境变量 RATE_LIMIT_<上游>_RPS / RATE_LIMIT_<上游>_TPM 设置。
+    """
+
+    def __init__(self) -> None:
+        self._buckets: dict = {}  # 上游 -> (rps 桶或 None, tpm 桶或 None)
+        self._stats: dict = {}
+        self._lock = threading.Lock()
+
+    def configure(self, upstream: str, rps: float | None = None, tpm: float | None = None, burst: float | None = None) -> None:
+        """设置上游的限额
+
+        Args:
+            upstream: 上游名称
+            rps: 每秒请求数上限
+            tpm: 每分钟 token 数上限
+            burst: 允许的突发请求数，默认等于 rps（至少为 1）
+        """
+        buckets = self._make_buckets(rps, tpm, burst)
+        with self._lock:
+            self._buckets[upstream] = buckets
+
+    @staticmethod
+    def _make_buckets(rps: float | None, tpm: float | None, burst: float | None = None) -> tuple:
+        rps_bucket = TokenBucket(rps, burst or max(1.0, rps)) if rps else None
+        # token 桶容量取一分钟的额度，超出后按速率补充
+        tpm_bucket = TokenBucket(tpm / 60.0, tpm) if tpm else None
+        return rps_bucket, tpm_bucket
+
+    def _get_buckets(self, upstream: str) -> tuple:
+        with self._lock:
+            buckets = self._buckets.get(upstream)
+        if buckets is None:
+            # 首次使用的上游从环境变量读取限额
+            prefix = f"RATE_LIMIT_{upstream.upper().replace('-', '_').replace('.', '_')}"
+            rps = os.getenv(f"{prefix}_RPS")
+            tpm = os.getenv(f"{prefix}_TPM")
+            new_buckets = self._make_buckets(
+                float(rps) if rps else None, float(tpm) if tpm else None
+            )
+            with self._lock:
+                buckets = self._buckets.setdefault(upstream, new_buckets)
+        return buckets
+
+    def _reserve(self, upstream: str, tokens: float, max_wait: float | None) -> float:
+        rps_bucket, tpm_bucket = self._get_buckets(upstream)
+        wait = 0.0
+        if rps_bucket is not None:
+            wait = rps_bucket.reserve(1)
+        if tpm_bucket is not None and tokens:
+            wait = max(wait, tpm_bucket.reserve(tokens))
+        if max_wait is not None and wait > max_wait:
+            # 放弃排队，归还已预约的令牌
+            if rps_bucket is not None:
+                rps_bucket.refund(1)
+            if tpm_bucket is not None and tokens:
+                tpm_bucket.refund(tokens)
+            self._record(upstream, 0.0, rejected=True)
+            raise RateLimitTimeout(f"{upstream} 限流排队需要 {wait:.2f} 秒，超过允许的 {max_wait:.2f} 秒")
+        self._record(upstream, wait)
+        return wait
+
+    def _record(self, upstream: str, wait: float, rejected: bool = False) -> None:
+        with self._lock:
+            stats = self._stats.setdefault(
+                upstream, {"calls": 0, "rejected": 0, "total_wait": 0.0, "max_wait": 0.0}
+            )
+            if rejected:
+                stats["rejected"] += 1
+                return
+            stats["calls"] += 1
+            stats["total_wait"] += wait
+            stats["max_wait"] = max(stats["max_wait"], wait)
+
+    def acquire(self, upstream: str, tokens: float = 0, max_wait: float | None = None) -> float:
+        """线程中使用：按需等待后返回实际排队时间（秒）"""
+        wait = self._reserve(upstream, tokens, max_wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, upstream: str, tokens: float = 0, max_wait: float | None = None) -> float:
+        """asyncio 中使用：与 acquire 共用同一组令牌桶"""
+        wait = self._reserve(upstream, tokens, max_wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, upstream: str, estimated: float, actual: float) -> None:
+        """调用完成后按实际 token 用量修正预估值"""
+        _, tpm_bucket = self._get_buckets(upstream)
+        if tpm_bucket is None or actual == estimated:
+            return
+        if actual > estimated:
+            tpm_bucket.reserve(actual - estimated)
+        else:
+            tpm_bucket.refund(estimated - actual)
+
+    def stats(self) -> dict:
+        """各上游的排队统计，avg_wait 为平均排队时间（秒）"""
+        with self._lock:
+            return {
+                upstream: {
+                    **stats,
+                    "avg_wait": stats["total_wait"] / stats["calls"] if stats["calls"] else 0.0,
+                }
+                for upstream, stats in self._stats.items()
+            }
+
+
+_LIMITER = RateLimiter()
+
+
+def get_limiter() -> RateLimiter:
+    """获取进程内共享的限流器"""
+    return _LIMITER
@@ -0,0 +1,78 @@
+import hashlib
+import re
+import threading
+
+_NORMALIZE_PATTERN = re.compile(r"[\W_]+")
+
+
+def _normalize(text: str) -> str:
+    return _NORMALIZE_PATTERN.sub("", text.lower())
+
+
+def _bigrams(text: str) -> set:
+    text = _normalize(text)
+    if len(text) < 2:
+        return {text}
+    return {text[i : i + 2] for i in range(len(text) - 1)}
+
+
+def fingerprint(text: str) -> str:
+    """对 URL 或摘要文本做归一化后的短指纹"""
+    return hashlib.blake2b(_normalize(text).encode("utf-8"), digest_size=8).hexdigest()
+
+
+class SearchMemory:
+    """
+    单次会话内的搜索结果记忆
+
+    - 记录每条返回过的摘要 / URL 指纹，重复出现时只给出简短引用
+    - 记录历史查询，近似查询直接复用之前的结果，不再请求搜索接口
+    - 规划模式下同一会话的多个搜索会并行执行，读写都在锁内进行
+    """
+
+    def __init__(self, query_threshold: float = 0.8) -> None:
+        # 查询相似度（字二元组 Jaccard）达到该阈值视为近似查询
+        self.query_threshold = query_threshold
+        self._queries: list = []  # [(查询, 二元组集合)]
+        self._seen: dict = {}  # 指纹 -> (第几次搜索, 标题)
+        self.stats = {"searches": 0, "reused_queries": 0, "deduped_items": 0}
+        self._lock = threading.Lock()
+
+    def find_similar(self, query: str) -> str:
+        """查找近似的历史查询，找到时返回引用说明，否则返回空字符串"""
+        grams = _bigrams(query)
+        with self._lock:
+            for search_no, (previous, previous_grams) in enumerate(self._queries, 1):
+                union = grams | previous_grams
+                similarity = len(grams & previous_grams) / len(union) if union else 1.0
+                if similarity >= self.query_threshold:
+                    self.stats["reused_queries"] += 1
+                    return f"该查询与第 {search_no} 次搜索「{previous}」相近，结果相同，请直接参考当时的观察结果。"
+        return ""
+
+    def start_search(self, query: str) -> int:
+        """登记一次新的搜索，返回搜索序号（从 1 开始）"""
+        grams = _bigrams(query)
+        with self._lock:
+            self._queries.append((query, grams))
+            self.stats["searches"] += 1
+            return len(self._queries)
+
+    def back_reference(self, search_no: int, keys: list, label: str) -> str:
+        """检查条目是否出现过：出现过返回引用说明，否则登记并返回空字符串
+
+        Args:
+            search_no: 当前搜索序号
+            keys: 条目的 URL、摘要等文本，任一命中即视为重复
+            label: 条目标题，用于引用说明
+        """
+        prints = [fingerprint(key) for key in keys if key]
+        with self._lock:
+            for fp in prints:
+                if fp in self._seen:
+                    seen_no, seen_label = self._seen[fp]
+                    self.stats["deduped_items"] += 1
+                    return f"「{seen_label}」与第 {seen_no} 次搜索结果重复，已省略"
+            for fp in prints:
+                self._seen[fp] = (search_no, label)
+        return ""
@@ -0,0 +1,188 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+# 命中时距上次访问超过该秒数才更新访问时间，避免每次读取都变成一次写入
+ACCESS_RESOLUTION = 60.0
+# 每写入多少次清理一次过期条目（容量每次写入都检查）
+EVICT_EVERY = 64
+
+
+def default_cache_path() -> str:
+    """缓存文件路径：环境变量 TOOL_CACHE_PATH，未设置时放在当前用户的缓存目录
+
+    不放在系统临时目录：那里所有用户都可写，其他用户可以抢先创建或篡改缓存文件。
+    目录在首次连接时才创建。
+    """
+    path = os.getenv("TOOL_CACHE_PATH")
+    if path:
+        return path
+    cache_home = os.getenv("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "react_agent", "tool_cache.sqlite3")
+
+
+def cache_key(tool_name: str, kwargs: dict) -> str:
+    payload = json.dumps([tool_name, kwargs], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class SharedToolCache:
+    """
+    同一台机器上多个进程共享的工具结果缓存（SQLite WAL 模式）
+
+    - WAL 模式下读不阻塞写，多个进程可以同时读写；写冲突时按 busy_timeout 等待
+    - 每条结果带过期时间，过期后视为未命中
+    - 结果总字节数由触发器维护在 usage 表中，所有进程共用；每次写入后读取该值，
+      超过 max_bytes 时按最近访问时间淘汰最久未用的条目；每写入 EVICT_EVERY 次清理一次过期条目
+    - 每个线程（fork 后的子进程也是）使用自己的连接
+    - 任何数据库错误（包括缓存目录无法创建）都按未命中处理，缓存不可用不影响工具调用
+    """
+
+    def __init__(
+        self, path: str | None = None, max_bytes: int = 64 * 1024 * 1024, busy_timeout_ms: int = 5000
+    ) -> None:
+        self.path = path or default_cache_path()
+        self.max_bytes = max_bytes
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0, "errors": 0}
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.executescript(
+            """
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY,
+                tool TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_results_last_access ON results (last_access);
+            CREATE INDEX IF NOT EXISTS idx_results_expires_at ON results (expires_at);
+            CREATE TABLE IF NOT EXISTS usage (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL);
+            INSERT OR IGNORE INTO usage SELECT 0, COALESCE(SUM(size), 0) FROM results;
+            CREATE TRIGGER IF NOT EXISTS results_insert AFTER INSERT ON results
+            BEGIN UPDATE usage SET total = total + NEW.size WHERE id = 0; END;
+            CREATE TRIGGER IF NOT EXISTS results_update AFTER UPDATE OF size ON results
+            BEGIN UPDATE usage SET total = total + NEW.size - OLD.size WHERE id = 0; END;
+            CREATE TRIGGER IF NOT EXISTS results_delete AFTER DELETE ON results
+            BEGIN UPDATE usage SET total = total - OLD.size WHERE id = 0; END;
+            COMMIT;
+            """
+        )
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.stats[name] += n
+
+    def get(self, tool_name: str, kwargs: dict) -> str | None:
+        """读取未过期的缓存结果，未命中返回 None"""
+        key = cache_key(tool_name, kwargs)
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, last_access FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self._count("misses")
+                return None
+            if now - row[2] > ACCESS_RESOLUTION:
+                conn.execute("UPDATE results SET last_access = ? WHERE key = ?", (now, key))
+        except (sqlite3.Error, OSError):
+            self._count("errors")
+            return None
+        self._count("hits")
+        return row[0]
+
+    def put(self, tool_name: str, kwargs: dict, value: str, ttl: float) -> None:
+        """写入一条结果，ttl 秒后过期"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        try:
+            conn = self._conn()
+            # 不用 INSERT OR REPLACE：REPLACE 删除旧行时不触发删除触发器，usage 会少减
+            conn.execute(
+                "INSERT INTO results (key, tool, value, size, expires_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET "
+                "tool = excluded.tool, value = excluded.value, size = excluded.size, "
+                "expires_at = excluded.expires_at, last_access = excluded.last_access",
+                (cache_key(tool_name, kwargs), tool_name, value, size, now + ttl, now),
+            )
+            total = conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+        except (sqlite3.Error, OSError):
+            self._count("errors")
+            return
+        with self._lock:
+            self.stats["writes"] += 1
+            self._writes += 1
+            due = self._writes % EVICT_EVERY == 0
+        if due or total > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> int:
+        """删除过期条目，并在超出容量时按最近访问时间淘汰，返回删除的条数"""
+        try:
+            conn = self._conn()
+            removed = conn.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),)).rowcount
+            total = conn.execute("SELECT total FROM usage WHERE id = 0").fetchone()[0]
+            if total > self.max_bytes:
+                # 淘汰到容量的 90%，避免每次写入都触发淘汰
+                excess = total - int(self.max_bytes * 0.9)
+                victims = 0
+                for (size,) in conn.execute("SELECT size FROM results ORDER BY last_access"):
+                    victims += 1
+                    excess -= size
+                    if excess <= 0:
+                        break
+                removed += conn.execute(
+                    "DELETE FROM results WHERE key IN "
+                    "(SELECT key FROM results ORDER BY last_access LIMIT ?)",
+                    (victims,),
+                ).rowcount
+        except (sqlite3.Error, OSError):
+            self._count("errors")
+            return 0
+        self._count("evictions", removed)
+        return removed
+
+    def clear(self) -> None:
+        try:
+            self._conn().execute("DELETE FROM results")
+        except (sqlite3.Error, OSError):
+            self._count("errors")
+
+
+_CACHE = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_shared_cache() -> SharedToolCache:
+    """获取进程内共享的缓存实例（数据本身通过文件在进程间共享）"""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = SharedToolCache()
+        return _CACHE
@@ -1,8 +1,31 @@
+import inspect
 import json
 import os
 from typing import List, Dict, Any, Callable
 from weather import get_weather, WEATHER_SCHEMA
 from google_search import google_search, GOOGLE_SEARCH
+from compress import compress_observation, estimate_tokens
+from search_memory import SearchMemory
+from executor import ToolExecutor, get_process_executor
+from validator import compile_validator
+from shared_cache import get_shared_cache
+
+# 未声明 observation_budget 的工具使用的默认预算，<= 0 表示不压缩
+DEFAULT_OBSERVATION_BUDGET = 500
+# 未声明 timeout 的工具使用的默认超时（秒）
+DEFAULT_TOOL_TIMEOUT = 30.0
+
+
+def check_tool_schema(name: str, schema: dict) -> None:
+    """注册时检查 schema 中互相冲突的声明，冲突时抛出 ValueError"""
+    if not schema.get("session_memory"):
+        return
+    # 使用会话内搜索记忆的工具结果依赖会话状态，命中缓存会绕过去重，不能共享
+    if schema.get("cache_ttl"):
+        raise ValueError(f"工具 {name} 使用 session_memory，不能声明 cache_ttl")
+    # SearchMemory 持有锁，无法序列化传给工作进程，工作进程中的修改也不会同步回来
+    if schema.get("execution") == "process":
+        raise ValueError(f"工具 {name} 使用 session_memory，不能在进程池中执行")
 
 
 class ReactTools:
@@ -21,12 +44,120 @@ class ReactTools:
         }
         # 用于生成prompt
         self.toolConfig = [WEATHER_SCHEMA, GOOGLE_SEARCH]
+        self._schemas = {tool["name_for_model"]: tool for tool in self.toolConfig}
+        # 注册时按 schema 预编译参数校验函数，调用前先校验和纠正参数
+        self._validators = {name: compile_validator(schema) for name, schema in self._schemas.items()}
+        # 支持 timeout / cancel_event 参数的工具，执行时传入剩余时间和取消事件
+        self._accepts_timeout = set()
+        self._accepts_cancel = set()
+        for name, func in self._tools_map.items():
+            parameters = inspect.signature(func).parameters
+            if "timeout" in parameters:
+                self._accepts_timeout.add(name)
+            if "cancel_event" in parameters:
+                self._accepts_cancel.add(name)
+        # 工具按 schema 中的 execution 字段选择执行方式：
+        # inline 在调用方线程直接执行；thread（默认）在线程池中执行，卡住的调用超时后被放弃；
+        # process 在预热好的进程池中执行，适合持有 GIL 的 CPU 密集型工具，
+        # 进程池由同一进程内的所有 ReactTools 实例共享
+        for name, schema in self._schemas.items():
+            check_tool_schema(name, schema)
+        self.executor = ToolExecutor()
+        self.process_executor = None
+        process_tools = [
+            self._tools_map[name]
+            for name, schema in self._schemas.items()
+            if schema.get("execution") == "process"
+        ]
+        if process_tools:
+            self.process_executor = get_process_executor(tuple(func.__module__ for func in process_tools))
+        # 当前会话的搜索记忆，由 new_session() 重置
+        self.session_memory = SearchMemory()
+        # 声明了 cache_ttl 的工具，结果写入同一台机器上所有进程共享的缓存
+        self.shared_cache = None
+        if any(schema.get("cache_ttl") for schema in self._schemas.values()):
+            self.shared_cache = get_shared_cache()
 
-    def execute_tool(self, tool_name: str, **kwargs) -> str:
-        """统一的工具执行入口"""
+    def new_session(self) -> SearchMemory:
+        """开始新的会话：清空会话内的搜索记忆"""
+        self.session_memory = SearchMemory()
+        return self.session_memory
+
+    def execute_tool(self, tool_name: str, arguments: dict, timeout: float | None = None) -> str:
+        """统一的工具执行入口
+
+        Args:
+            tool_name: 工具名
+            arguments: 模型给出的工具参数，整体作为字典传入，
+                其中的 timeout、tool_name 等键不会与本方法的参数冲突
+            timeout: 剩余时间预算（秒），与工具 schema 中声明的 timeout 取较小值
+        """
         if tool_name not in self._tools_map:
             return f"错误：工具 {tool_name} 未定义。"
-        return self._tools_map[tool_name](**kwargs)
+        kwargs = dict(arguments)
+        validator = self._validators.get(tool_name)
+        if validator is not None:
+            # 先于注入 timeout / memory 等内部参数校验，模型传入的同名参数会被丢弃
+            kwargs, error = validator(kwargs)
+            if error:
+                return f"错误：{error}"
+        schema = self._schemas.get(tool_name, {})
+        cache_ttl = schema.get("cache_ttl") if self.shared_cache is not None else None
+        if cache_ttl:
+            # 以校验后的模型参数为键，注入的 timeout / memory 等不参与
+            cache_args = dict(kwargs)
+            cached = self.shared_cache.get(tool_name, cache_args)
+            if cached is not None:
+                return cached
+
+        result = self._dispatch(tool_name, schema, timeout, kwargs)
+        # 错误和超时结果与调用时的状态有关，不写入共享缓存
+        if (
+            cache_ttl
+            and isinstance(result, str)
+            and not result.startswith("错误")
+            and not result.startswith('{"status"')
+        ):
+            self.shared_cache.put(tool_name, cache_args, result, cache_ttl)
+        return result
+
+    def _dispatch(self, tool_name: str, schema: dict, timeout: float | None, kwargs: dict) -> str:
+        """按 schema 的 execution 字段执行工具"""
+        tool_timeout = schema.get("timeout", DEFAULT_TOOL_TIMEOUT)
+        if timeout is not None:
+            tool_timeout = min(tool_timeout, timeout)
+        if tool_name in self._accepts_timeout:
+            kwargs["timeout"] = tool_timeout
+        if schema.get("session_memory"):
+            kwargs["memory"] = self.session_memory
+
+        execution = schema.get("execution", "thread")
+        if execution == "inline":
+            return self._tools_map[tool_name](**kwargs)
+        if execution == "process":
+            return self.process_executor.run(
+                tool_name, self._tools_map[tool_name], kwargs, tool_timeout
+            )
+        return self.executor.run(
+            tool_name,
+            self._tools_map[tool_name],
+            kwargs,
+            tool_timeout,
+            accepts_cancel=tool_name in self._accepts_cancel,
+        )
+
+    def fit_observation(self, tool_name: str, result: str, query: str = "") -> tuple[str, int, int]:
+        """按工具声明的 token 预算压缩观察结果
+
+        Returns:
+            (压缩后的文本, 原始 token 数, 压缩后 token 数)
+        """
+        result = str(result)
+        budget = self._schemas.get(tool_name, {}).get(
+            "observation_budget", DEFAULT_OBSERVATION_BUDGET
+        )
+        fitted = compress_observation(result, query, budget)
+        return fitted, estimate_tokens(result), estimate_tokens(fitted)
 
     def get_tool_descriptions(self) -> str:
         """
@@ -43,5 +174,5 @@ class ReactTools:
 if __name__ == "__main__":
     Tool = ReactTools()
     print(Tool.get_tool_descriptions())
-    print(Tool.execute_tool("get_weather", city="上海"))
-    print(Tool.execute_tool("google_search", search_query="Python编程语言的优缺点"))
+    print(Tool.execute_tool("get_weather", {"city": "上海"}))
+    print(Tool.execute_tool("google_search", {"search_query": "Python编程语言的优缺点"}))
@@ -1,10 +1,89 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from tool import *
 from google_search import google_search
 from weather import get_weather
+from page_fetch import fetch_pages
+
+# 本地网页夹具：正常页面、超大页面、慢页面、非 HTML 内容
+FIXTURE_PAGES = {
+    "/article": "<html><head><title>标题</title><style>p{}</style></head><body>"
+    "<nav>首页 | 关于</nav><h1>Python 简介</h1><p>Python 是一种解释型语言。</p>"
+    "<script>var x = 1;</script><p>它的优点是语法简洁。</p><footer>版权所有</footer></body></html>",
+    "/large": "<html><body>" + "<p>重复的段落内容。</p>" * 50000 + "</body></html>",
+}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(3)
+        if self.path == "/binary":
+            body, content_type = b"\x00\x01" * 100, "application/octet-stream"
+        else:
+            html = FIXTURE_PAGES.get(self.path, "<p>慢页面</p>")
+            body, content_type = html.encode("utf-8"), "text/html; charset=utf-8"
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        try:
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def check_page_fetch():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FixtureHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    urls = [f"{base}{path}" for path in ("/article", "/large", "/slow", "/binary")]
+
+    start = time.perf_counter()
+    pages = fetch_pages(urls, timeout=1.0, max_chars=500)
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    print(pages)
+    assert "解释型语言" in pages[urls[0]] and "首页" not in pages[urls[0]]
+    assert "var x" not in pages[urls[0]] and "版权所有" not in pages[urls[0]]
+    assert len(pages[urls[1]]) <= 500
+    assert urls[2] not in pages and urls[3] not in pages
+    assert elapsed < 1.5, elapsed
+    print(f"本地夹具抓取通过，耗时 {elapsed:.2f}s")
+
+
+def check_process_tool():
+    import compress
+    from executor import get_process_executor
+
+    executor = get_process_executor(("compress",))
+    assert get_process_executor(("compress",)) is executor
+    text = "第一句话很长。" * 200 + "Python 是一种解释型语言。"
+    kwargs = {"text": text, "query": "Python 解释型", "budget": 50}
+    result = executor.run("compress_observation", compress.compress_observation, dict(kwargs), timeout=10.0)
+    assert result == compress.compress_observation(**kwargs), result
+    print(result)
+
+    try:
+        check_tool_schema("memory_tool", {"session_memory": True, "execution": "process"})
+    except ValueError as e:
+        print(e)
+    else:
+        raise AssertionError("session_memory 工具不应允许在进程池中执行")
+    print("进程池工具执行通过")
+
+
+check_page_fetch()
+check_process_tool()
 
 Tool = ReactTools()
 
 # print(Tool.get_tool_descriptions())
-# print(Tool.execute_tool("get_weather", city="上海"))
+# print(Tool.execute_tool("get_weather", {"city": "上海"}))
 
-print(Tool.execute_tool("google_search", search_query="Python编程语言的优缺点"))
+print(Tool.execute_tool("google_search", {"search_query": "Python编程语言的优缺点"}))
@@ -0,0 +1,144 @@
+import json
+from typing import Callable
+
+_TRUE_VALUES = {"true", "1", "yes", "y", "是", "对"}
+_FALSE_VALUES = {"false", "0", "no", "n", "否", "不"}
+
+
+def _to_string(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, bool)):
+        return str(value)
+    if isinstance(value, list) and len(value) == 1 and isinstance(value[0], str):
+        return value[0]
+    raise ValueError
+
+
+def _to_integer(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str):
+        return int(value.strip())
+    raise ValueError
+
+
+def _to_number(value):
+    if isinstance(value, bool):
+        raise ValueError
+    if isinstance(value, (int, float)):
+        return value
+    if isinstance(value, str):
+        return float(value.strip())
+    raise ValueError
+
+
+def _to_boolean(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE_VALUES:
+            return True
+        if text in _FALSE_VALUES:
+            return False
+    raise ValueError
+
+
+def _to_array(value):
+    if isinstance(value, list):
+        return value
+    if isinstance(value, str):
+        text = value.strip()
+        if text.startswith("["):
+            return json.loads(text)
+        return [part.strip() for part in text.split(",") if part.strip()]
+    return [value]
+
+
+def _to_object(value):
+    if isinstance(value, dict):
+        return value
+    if isinstance(value, str):
+        parsed = json.loads(value)
+        if isinstance(parsed, dict):
+            return parsed
+    raise ValueError
+
+
+_CONVERTERS = {
+    "string": _to_string,
+    "integer": _to_integer,
+    "number": _to_number,
+    "boolean": _to_boolean,
+    "array": _to_array,
+    "object": _to_object,
+}
+
+
+def compile_validator(schema: dict) -> Callable[[dict], tuple[dict, str]]:
+    """根据工具 schema 的 parameters 列表预编译参数校验函数
+
+    注册工具时调用一次，之后每次调用只做字典查找和类型转换。校验函数会：
+    - 补救常见错误：只缺一个必填参数且只多一个未知参数时，把未知参数当作缺失的参数
+      （如 get_weather 收到 search_query）；忽略大小写不同的参数名；
+      把 "3"、"true" 等字符串转换为声明的类型
+    - 丢弃 schema 中没有声明的多余参数
+    - 无法补救时返回精确的错误提示
+
+    Returns:
+        校验函数：输入参数字典，返回 (转换后的参数, 错误提示)，通过时错误提示为空字符串
+    """
+    tool_name = schema["name_for_model"]
+    params = schema.get("parameters", [])
+    converters = {
+        p["name"]: _CONVERTERS.get(p.get("schema", {}).get("type", "string"), lambda v: v)
+        for p in params
+    }
+    types = {p["name"]: p.get("schema", {}).get("type", "string") for p in params}
+    required = tuple(p["name"] for p in params if p.get("required"))
+    lowered = {name.lower(): name for name in converters}
+    example = json.dumps({name: "..." for name in required}, ensure_ascii=False)
+    descriptions = {
+        p["name"]: f"{p['name']}（{p.get('description', '')}，类型 {types[p['name']]}）"
+        for p in params
+    }
+
+    def validate(kwargs: dict) -> tuple[dict, str]:
+        clean = {}
+        unknown = []
+        for key, value in kwargs.items():
+            name = key if key in converters else lowered.get(str(key).lower())
+            if name is None:
+                unknown.append(key)
+            else:
+                clean[name] = value
+
+        missing = [name for name in required if name not in clean]
+        if len(missing) == 1 and len(unknown) == 1:
+            clean[missing[0]] = kwargs[unknown[0]]
+            missing = []
+
+        if missing:
+            hint = f"工具 {tool_name} 缺少必填参数 " + "、".join(descriptions[n] for n in missing)
+            if unknown:
+                hint += "；不支持的参数 " + "、".join(str(k) for k in unknown)
+            return {}, f"{hint}。正确的行动输入示例：{example}"
+
+        for name, value in clean.items():
+            try:
+                clean[name] = converters[name](value)
+            except (ValueError, TypeError):
+                return {}, (
+                    f"工具 {tool_name} 的参数 {descriptions[name]} 无法使用取值 {value!r}。"
+                    f"正确的行动输入示例：{example}"
+                )
+        return clean, ""
+
+    return validate
@@ -1,17 +1,27 @@
 # tools/weather.py
+import threading
 import requests
+from rate_limit import get_limiter
 
 
-def get_weather(city: str) -> str:
+def get_weather(
+    city: str, timeout: float = 10.0, cancel_event: threading.Event | None = None
+) -> str:
     """
     通过调用 wttr.in API 查询真实的天气信息。
+
+    timeout 为本次调用的时间上限（秒），包含限流排队时间；
+    cancel_event 被设置时（调用方已放弃）不再发起请求。
     """
     # API端点，我们请求JSON格式的数据
     url = f"https://wttr.in/{city}?format=j1"
 
     try:
-        # 发起网络请求
-        response = requests.get(url)
+        # 发起网络请求，先在共享限流器中排队
+        waited = get_limiter().acquire("wttr", max_wait=timeout)
+        if cancel_event is not None and cancel_event.is_set():
+            return "错误:查询天气已取消"
+        response = requests.get(url, timeout=max(0.1, timeout - waited))
         # 检查响应状态码是否为200 (成功)
         response.raise_for_status()
         # 解析返回的JSON数据
@@ -28,6 +38,9 @@ def get_weather(city: str) -> str:
     except requests.exceptions.RequestException as e:
         # 处理网络错误
         return f"错误:查询天气时遇到网络问题 - {e}"
+    except TimeoutError as e:
+        # 限流排队超出时间预算
+        return f"错误:查询天气超时 - {e}"
     except (KeyError, IndexError) as e:
         # 处理数据解析错误
         return f"错误:解析天气数据失败，可能是城市名称无效 - {e}"
@@ -37,6 +50,14 @@ WEATHER_SCHEMA = {
     "name_for_human": "天气查询",
     "name_for_model": "get_weather",
     "description_for_model": "查询指定城市的实时天气信息。",
+    # 执行方式：inline / thread / process，网络请求类工具使用线程池
+    "execution": "thread",
+    # 单次调用的超时时间（秒），超时后 Agent 放弃等待
+    "timeout": 10,
+    # 结果在本机所有进程间共享缓存的时间（秒）
+    "cache_ttl": 600,
+    # 观察结果进入对话历史前的 token 预算
+    "observation_budget": 100,
     "parameters": [
         {
             "name": "city",
@@ -0,0 +1,106 @@
+import sqlite3
+import threading
+import time
+
+
+class PreferenceStore:
+    """
+    旅行助手的用户偏好持久化存储（SQLite）
+
+    - users: 用户的基础偏好和预算
+    - constraints: 用户提出的避雷因素，city 为空字符串表示对所有城市生效
+    - rejections: 用户拒绝过的景点
+    约束和拒绝记录都按 (user_id, city) 建索引，只取与当前城市相关的前 K 条放进提示词。
+    """
+
+    def __init__(self, db_path: str = "travel_memory.sqlite3") -> None:
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS users (
+                    user_id TEXT PRIMARY KEY,
+                    preference TEXT NOT NULL,
+                    budget TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS constraints (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    city TEXT NOT NULL DEFAULT '',
+                    factor TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_constraints_user_city
+                    ON constraints (user_id, city, created_at);
+                CREATE TABLE IF NOT EXISTS rejections (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    city TEXT NOT NULL DEFAULT '',
+                    attraction TEXT NOT NULL,
+                    reason TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_rejections_user_city
+                    ON rejections (user_id, city, created_at);
+                """
+            )
+
+    def get_profile(self, user_id: str, preference: str, budget: str) -> dict:
+        """读取用户的基础偏好，不存在时用给定的默认值创建"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO users (user_id, preference, budget) VALUES (?, ?, ?)",
+                (user_id, preference, budget),
+            )
+            row = self._conn.execute(
+                "SELECT preference, budget FROM users WHERE user_id = ?", (user_id,)
+            ).fetchone()
+        return {"preference": row[0], "budget": row[1]}
+
+    def add_constraint(self, user_id: str, factor: str, city: str = "") -> None:
+        """记录一条避雷因素"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO constraints (user_id, city, factor, created_at) VALUES (?, ?, ?, ?)",
+                (user_id, city, factor, time.time()),
+            )
+
+    def add_rejection(self, user_id: str, city: str, attraction: str, reason: str = "") -> None:
+        """记录一个被拒绝的景点"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO rejections (user_id, city, attraction, reason, created_at) VALUES (?, ?, ?, ?, ?)",
+                (user_id, city, attraction, reason, time.time()),
+            )
+
+    def relevant_constraints(self, user_id: str, city: str = "", k: int = 5) -> list:
+        """取出与当前城市最相关的前 K 条约束
+
+        该城市拒绝过的景点优先，其次是该城市和全局的避雷因素，同类按时间由新到旧。
+        """
+        with self._lock:
+            rejected = self._conn.execute(
+                "SELECT attraction, reason FROM rejections "
+                "WHERE user_id = ? AND city = ? ORDER BY created_at DESC LIMIT ?",
+                (user_id, city, k),
+            ).fetchall()
+            factors = self._conn.execute(
+                "SELECT factor FROM ("
+                "  SELECT factor, created_at, 1 AS rank FROM constraints WHERE user_id = ? AND city = ? AND city != ''"
+                "  UNION ALL"
+                "  SELECT factor, created_at, 0 AS rank FROM constraints WHERE user_id = ? AND city = ''"
+                ") ORDER BY rank DESC, created_at DESC LIMIT ?",
+                (user_id, city, user_id, max(0, k - len(rejected))),
+            ).fetchall()
+        results = [
+            f"不要再推荐{attraction}" + (f"（{reason}）" if reason else "")
+            for attraction, reason in rejected
+        ]
+        results.extend(f"推荐时避开：{factor}" for (factor,) in factors)
+        return results
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,12 +1,28 @@
+import argparse
+import json
 import requests
 import re
 import os
+import sys
+import time
 from openai import OpenAI
 from tavily import TavilyClient
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
+from preference_store import PreferenceStore
+
+# 检查点读取、观察压缩、内存分析等公共模块与 advanced task 中的 ReAct Agent 共用
+AGENT_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), os.pardir, "advanced task", "task2_agent"
+)
+for path in (AGENT_DIR, os.path.join(AGENT_DIR, "tool")):
+    if path not in sys.path:
+        sys.path.append(path)
+from checkpoint import load_jsonl_records
+from compress import compress_observation, estimate_tokens
+from profiling import NULL_PROFILER, StepProfiler, format_report
 
 # system_prompt init
 AGENT_SYSTEM_PROMPT = """
@@ -62,6 +78,114 @@ class OpenAICompatibleClient:
             print(f"调用LLM API时发生错误: {e}")
             return "错误:调用语言模型服务时出错。"
 
+    def generate_stream(self, messages: list, on_text) -> str:
+        """以流式方式调用LLM API，每收到一段文本就交给 on_text，返回完整回应。"""
+        print("正在调用大语言模型...")
+        try:
+            stream = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+            )
+            parts = []
+            for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    on_text(delta)
+            return "".join(parts)
+        except Exception as e:
+            print(f"调用LLM API时发生错误: {e}")
+            return "错误:调用语言模型服务时出错。"
+
+
+class AnswerStreamer:
+    """
+    流式输出时只把 finish / query 的 answer 文本实时打印给用户
+
+    Thought 和 Action 前缀先缓存在内存中不显示；第一个 Action 是 `finish(answer="` 或
+    `query(answer="` 时，answer 的内容边到边打印。第一个 Action 是工具调用时整段都不显示，
+    即使后面多出来的 Thought-Action 对里有 finish（这部分会被截断）。结尾的 `")` 可能被拆在两个分片里，末尾的 `"` 和最后一个 `")`
+    之后的内容先扣住，确认不是结尾后再输出。
+    """
+
+    _MARKERS = {"finish": 'finish(answer="', "query": 'query(answer="'}
+    _LABELS = {"finish": "\n✨ 智能助手回答: ", "query": "\n✨ 智能助手: "}
+
+    def __init__(self) -> None:
+        self.buffer = ""
+        self.started_at = time.perf_counter()
+        self.ttft = None  # 首个可见字符的延迟（秒）
+        self.kind = None  # 正在输出的动作：finish / query
+        self._answer_start = None
+        self._emitted = 0
+        self._closed = False
+
+    def feed(self, text: str) -> None:
+        self.buffer += text
+        if self._closed:
+            return
+        if self._answer_start is None:
+            # 只看第一个 Action
+            first = self.buffer.find("Action:")
+            if first < 0:
+                return
+            after = first + len("Action:")
+            rest = self.buffer[after:].lstrip()
+            position = len(self.buffer) - len(rest)
+            for kind, marker in self._MARKERS.items():
+                if rest.startswith(marker):
+                    break
+                if marker.startswith(rest):
+                    # 已收到的内容还不足以判断是哪种动作
+                    return
+            else:
+                self._closed = True
+                return
+            self.kind = kind
+            self._answer_start = position + len(marker)
+            self._emitted = self._answer_start
+            print(self._LABELS[self.kind], end="", flush=True)
+
+        answer = self.buffer[self._answer_start :]
+        end = answer.rfind('")')
+        if end >= 0 and "\n" in answer[end:]:
+            # `")` 之后已经换行，说明 answer 已经结束（后面可能是多余的 Thought-Action）
+            self._emit(self._answer_start + end)
+            self._closed = True
+            return
+        upto = len(self.buffer)
+        if end >= 0:
+            upto = self._answer_start + end
+        elif self.buffer.endswith('"'):
+            upto -= 1
+        self._emit(upto)
+
+    def _emit(self, upto: int) -> None:
+        if upto <= self._emitted:
+            return
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self.started_at
+        print(self.buffer[self._emitted : upto], end="", flush=True)
+        self._emitted = upto
+
+    def close(self) -> None:
+        """回应结束：输出剩余的 answer 文本（不含结尾的 `")`）"""
+        if self._answer_start is not None and not self._closed:
+            answer = self.buffer[self._answer_start :]
+            end = answer.rfind('")')
+            self._emit(self._answer_start + (end if end >= 0 else len(answer)))
+            self._closed = True
+        if self._answer_start is not None:
+            print()
+
+    @property
+    def shown(self) -> bool:
+        """answer 是否已经流式展示给用户"""
+        return self._answer_start is not None
+
 
 def get_weather(city: str) -> str:
     """
@@ -124,8 +248,92 @@ def get_attraction(city: str, weather: str) -> str:
 
 # skills dictionary
 skills = {"get_weather": get_weather, "get_attraction": get_attraction}
+# 观察结果进入对话历史前的 token 预算，<= 0 表示不压缩
+skill_budgets = {"get_weather": 100, "get_attraction": 400}
+
+# 观察压缩统计：每条被压缩的观察在之后的每次 LLM 调用中都会少发送节省的 token
+compression_stats = {"raw_tokens": 0, "kept_tokens": 0, "llm_calls": 0, "savings": []}
+
+
+def fit_observation(tool_name: str, observation, query: str) -> str:
+    """按工具的 token 预算压缩观察结果，并记录节省的 token 数"""
+    observation = str(observation)
+    fitted = compress_observation(observation, query, skill_budgets.get(tool_name, 0))
+    raw_tokens, kept_tokens = estimate_tokens(observation), estimate_tokens(fitted)
+    compression_stats["raw_tokens"] += raw_tokens
+    compression_stats["kept_tokens"] += kept_tokens
+    if raw_tokens > kept_tokens:
+        compression_stats["savings"].append((compression_stats["llm_calls"], raw_tokens - kept_tokens))
+    return fitted
+
+
+def print_compression() -> None:
+    saved = sum(
+        tokens * (compression_stats["llm_calls"] - calls_before)
+        for calls_before, tokens in compression_stats["savings"]
+    )
+    print(
+        f"观察压缩: {compression_stats['raw_tokens']} -> {compression_stats['kept_tokens']} tokens，"
+        f"本次共节省约 {saved} 个 prompt token"
+    )
+
+
+# 放进系统提示的与当前城市相关的约束条数
+TOP_K_CONSTRAINTS = 5
+# 连续多次不满意后追加到系统提示中的反思要求
+REFLECTION_PROMPT = "\n【重要反思】：用户已连续多次不满意！请彻底放弃之前的推荐思路，尝试更独特或更符合用户避雷要求的方案。"
+
+
+def build_system_prompt(store: PreferenceStore, user_memory: dict, reflection: bool = False) -> str:
+    """组装系统提示：基础提示 + 用户偏好 + 与当前城市相关的前 K 条约束"""
+    prompt = AGENT_SYSTEM_PROMPT + f"\n用户发旅行偏好是:{user_memory['preference']}"
+    constraints = store.relevant_constraints(
+        user_memory["user_id"], user_memory["city"], TOP_K_CONSTRAINTS
+    )
+    if constraints:
+        prompt += "\n用户的历史反馈：\n" + "\n".join(f"- {c}" for c in constraints)
+    if reflection:
+        prompt += REFLECTION_PROMPT
+    return prompt
+
+# 会话检查点：每个会话一个 JSONL 文件，每一步只追加一行（预写日志风格）
+CHECKPOINT_DIR = "checkpoints"
+checkpoint_stats = {"appends": 0, "total_ms": 0.0}
+
+
+def append_checkpoint(path: str, record: dict) -> None:
+    """追加一条检查点记录，并统计耗时"""
+    start = time.perf_counter()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    checkpoint_stats["appends"] += 1
+    checkpoint_stats["total_ms"] += (time.perf_counter() - start) * 1000
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="智能旅行助手")
+    parser.add_argument("--session", help="会话 ID，指定后每一步都会写入检查点，重启后可继续")
+    parser.add_argument("--user", default="default", help="用户 ID，用于读取持久化的偏好")
+    parser.add_argument("--db", default="travel_memory.sqlite3", help="用户偏好数据库路径")
+    parser.add_argument(
+        "--stream",
+        action=argparse.BooleanOptionalAction,
+        default=True,
+        help="流式输出最终答案，并报告首字延迟（--no-stream 关闭）",
+    )
+    parser.add_argument("--profile", action="store_true", help="按阶段统计内存分配，退出时打印报告")
+    parser.add_argument(
+        "--profile-sites",
+        action="store_true",
+        help="同时按代码行统计分配热点（开销较大，需配合 --profile）",
+    )
+    cli_args = parser.parse_args()
+    # 内存分析：--profile 时按阶段（prompt、llm、parse、tool、history）统计 tracemalloc 分配
+    profiler = NULL_PROFILER
+    if cli_args.profile:
+        profiler = StepProfiler(trace_sites=cli_args.profile_sites)
+        profiler.start()
+
     # initialize LLM client
     load_dotenv()
     llm = OpenAICompatibleClient(
@@ -138,25 +346,75 @@ if __name__ == "__main__":
     print("欢迎使用智能旅行助手！")
 
     # initialize user memory
+    # 偏好、避雷因素和拒绝过的景点持久化在 SQLite 中，这里只保留当前会话需要的部分
+    store = PreferenceStore(cli_args.db)
     user_memory = {
-        "preference": "喜欢历史文化景点",
-        "budget": "中等预算",
-        "history_rejections": [],  # 记录用户拒绝过的景点
+        "user_id": cli_args.user,
+        **store.get_profile(cli_args.user, "喜欢历史文化景点", "中等预算"),
+        "city": "",  # 当前讨论的城市，用于检索相关约束
     }
-    user_query = input("\n✨ 请输入您的旅行相关问题 :")
-    # initialize chat history
-    chat_history = [
-        {
-            "role": "system",
-            "content": AGENT_SYSTEM_PROMPT
-            + f"\n用户发旅行偏好是:{user_memory['preference']}",
-        },
-        {"role": "user", "content": user_query},
-    ]
     # 开始标记
     START_flag = False
     # 记录不满意的次数
     UNSATISFIED_flag = 0
+    # 从检查点恢复时，当前问题已完成的循环次数
+    start_iteration = 0
+
+    checkpoint_path = None
+    records = []
+    if cli_args.session:
+        os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+        checkpoint_path = os.path.join(CHECKPOINT_DIR, f"{cli_args.session}.wal")
+        records = load_jsonl_records(checkpoint_path)
+
+    if records:
+        # 按顺序回放检查点，恢复对话历史和状态
+        chat_history = []
+        for record in records:
+            chat_history.extend(record["messages"])
+            if "system" in record:
+                chat_history[0]["content"] = record["system"]
+            user_memory = record["user_memory"]
+            UNSATISFIED_flag = record["unsatisfied"]
+            START_flag = record["awaiting_input"]
+            start_iteration = record["iteration"]
+        print(f"✨ 已从检查点恢复会话 {cli_args.session}，共 {len(chat_history)} 条消息")
+    else:
+        user_query = input("\n✨ 请输入您的旅行相关问题 :")
+        # initialize chat history
+        chat_history = [
+            {"role": "system", "content": build_system_prompt(store, user_memory)},
+            {"role": "user", "content": user_query},
+        ]
+
+    # 已写入检查点的消息条数和系统提示，每次只追加新增部分
+    persisted_messages = len(chat_history) if records else 0
+    persisted_system = chat_history[0]["content"] if records else None
+
+    def save_checkpoint(iteration: int, awaiting_input: bool) -> None:
+        """一步完成后追加检查点：只记录新增消息和变化过的系统提示"""
+        global persisted_messages, persisted_system
+        if checkpoint_path is None:
+            return
+        record = {
+            "messages": chat_history[persisted_messages:],
+            "user_memory": user_memory,
+            "unsatisfied": UNSATISFIED_flag,
+            "iteration": iteration,
+            "awaiting_input": awaiting_input,
+        }
+        if persisted_messages and chat_history[0]["content"] != persisted_system:
+            record["system"] = chat_history[0]["content"]
+        append_checkpoint(checkpoint_path, record)
+        persisted_messages = len(chat_history)
+        persisted_system = chat_history[0]["content"]
+
+    if not records:
+        save_checkpoint(0, False)
+
+    # 流式模式下每次展示答案的首字延迟（秒）
+    ttft_samples = []
+
     while True:
         if START_flag:
             user_query = input("\n✨ 请输入您的旅行相关问题 :")
@@ -164,12 +422,29 @@ if __name__ == "__main__":
             chat_history.append({"role": "user", "content": user_query})
             if user_query.lower() in ["exit", "quit", "退出"]:
                 print("\n✨ 很高兴为您服务！")
+                store.close()
+                if ttft_samples:
+                    print(
+                        f"首字延迟: {len(ttft_samples)} 次回答，"
+                        f"平均 {sum(ttft_samples) / len(ttft_samples) * 1000:.0f} ms，"
+                        f"最大 {max(ttft_samples) * 1000:.0f} ms"
+                    )
+                if cli_args.profile:
+                    print(format_report(profiler.stop()))
+                if compression_stats["savings"]:
+                    print_compression()
+                if checkpoint_stats["appends"]:
+                    print(
+                        f"检查点开销: {checkpoint_stats['appends']} 次追加，"
+                        f"平均 {checkpoint_stats['total_ms'] / checkpoint_stats['appends']:.3f} ms/步"
+                    )
                 break
+            save_checkpoint(0, False)
         else:
             START_flag = True
 
         # interaction loop
-        for i in range(100):
+        for i in range(start_iteration, 100):
             """
             运行的逻辑参考了给的代码模板，但是有改动，具体的逻辑如下：
             - 使用ChatPromptTemplate来定义prompt模板，使用list数据结构来实现聊天记录的存储，实现记录上下文功能
@@ -182,55 +457,74 @@ if __name__ == "__main__":
             """
             print(f"--- 循环 {i+1} ---\n")
 
-            # 构建提示词
-            # 这里返回的是一个Template对象
-            prompt_template = ChatPromptTemplate.from_messages(chat_history)
-
-            # 转换为 LangChain 消息对象
-            lc_messages = prompt_template.format_messages()
-
-            messages = []
-            for msg in lc_messages:
-                # 定义角色映射关系
-                role_map = {"human": "user", "ai": "assistant", "system": "system"}
-                # 如果是 LangChain 的 AIMessage，msg.type 是 'ai'，需转为 'assistant'
-                messages.append(
-                    {"role": role_map.get(msg.type, "user"), "content": msg.content}
-                )
+            with profiler.phase("prompt"):
+                # 构建提示词
+                # 这里返回的是一个Template对象
+                prompt_template = ChatPromptTemplate.from_messages(chat_history)
+
+                # 转换为 LangChain 消息对象
+                lc_messages = prompt_template.format_messages()
+
+                messages = []
+                for msg in lc_messages:
+                    # 定义角色映射关系
+                    role_map = {"human": "user", "ai": "assistant", "system": "system"}
+                    # 如果是 LangChain 的 AIMessage，msg.type 是 'ai'，需转为 'assistant'
+                    messages.append(
+                        {"role": role_map.get(msg.type, "user"), "content": msg.content}
+                    )
 
-            # 调用LLM生成回应
-            response = llm.generate(messages)
+            # 调用LLM生成回应：流式模式下只实时显示 answer，Thought 和 Action 静默缓存后再解析
+            streamer = None
+            with profiler.phase("llm"):
+                if cli_args.stream:
+                    streamer = AnswerStreamer()
+                    response = llm.generate_stream(messages, streamer.feed)
+                    streamer.close()
+                else:
+                    response = llm.generate(messages)
+            compression_stats["llm_calls"] += 1
+            if streamer is not None and streamer.ttft is not None:
+                ttft_samples.append(streamer.ttft)
+                print(f"（首字延迟 {streamer.ttft * 1000:.0f} ms）")
             # 处理多余输出的thought-Action
-            match = re.search(
-                r"(Thought:.*?Action:.*?)(?=\n\s*(?:Thought:|Action:|Observation:)|\Z)",
-                response,
-                re.DOTALL,
-            )
+            with profiler.phase("parse"):
+                match = re.search(
+                    r"(Thought:.*?Action:.*?)(?=\n\s*(?:Thought:|Action:|Observation:)|\Z)",
+                    response,
+                    re.DOTALL,
+                )
             if match:
                 truncated = match.group(1).strip()
                 if truncated != response.strip():
                     response = truncated
                     print("已截断多余的 Thought-Action 对")
-            print(f"模型输出:\n{response}\n")
+            if streamer is None:
+                print(f"模型输出:\n{response}\n")
             # FIXME:
             # print(response)
-            chat_history.append({"role": "assistant", "content": response})
+            with profiler.phase("history"):
+                chat_history.append({"role": "assistant", "content": response})
 
             # 解析并执行行动
-            action_match = re.search(r"Action: (.*)", response, re.DOTALL)
+            with profiler.phase("parse"):
+                action_match = re.search(r"Action: (.*)", response, re.DOTALL)
             if not action_match:
                 print("解析错误:模型输出中未找到 Action。")
+                save_checkpoint(0, True)
                 break
             action_str = action_match.group(1).strip()
 
             # 询问用户环节
             if action_str.startswith("query"):
                 final_answer = re.search(r'query\(answer="(.*)"\)', action_str).group(1)
-                print(f"\n✨ 智能助手: {final_answer}")
+                if streamer is None or not streamer.shown:
+                    print(f"\n✨ 智能助手: {final_answer}")
                 query_data = input("\n请您回答:")
                 chat_history.append(
                     {"role": "user", "content": f"Observation: {query_data}"}
                 )
+                save_checkpoint(0, True)
                 break
 
             # 最终回答环节
@@ -238,43 +532,59 @@ if __name__ == "__main__":
                 final_answer = re.search(r'finish\(answer="(.*)"\)', action_str).group(
                     1
                 )
-                print(f"\n✨ 智能助手回答: {final_answer}")
+                if streamer is None or not streamer.shown:
+                    print(f"\n✨ 智能助手回答: {final_answer}")
                 # 实现询问用户是否满意
                 feedback = input("\n您对这个建议还满意吗?(满意/不满意)")
                 if "不满意" in feedback:
                     UNSATISFIED_flag += 1
                     # 让用户说出原因
                     reason = input("能告诉我不满意的具体原因吗？")
+                    attraction = input("不想去的景点是？（可直接回车跳过）").strip()
                     # 更新长期记忆
-                    user_memory["preference"] += f"推荐时避开这些因素：{reason}"
+                    store.add_constraint(user_memory["user_id"], reason, user_memory["city"])
+                    if attraction:
+                        store.add_rejection(
+                            user_memory["user_id"], user_memory["city"], attraction, reason
+                        )
+                    chat_history[0]["content"] = build_system_prompt(
+                        store, user_memory, reflection=UNSATISFIED_flag >= 3
+                    )
                     chat_history.append(
                         {"role": "user", "content": f"Observation: {reason}"}
                     )
                     print(
                         f"✨ 已记录您的偏好。下次我会注意，我将为您重新推荐一个景点，若要退出本次对话请回复exit、quit、退出三者其一"
                     )
-                    if UNSATISFIED_flag >= 3:
-                        new_system_content = (
-                            AGENT_SYSTEM_PROMPT
-                            + "\n【重要反思】：用户已连续多次不满意！请彻底放弃之前的推荐思路，尝试更独特或更符合用户避雷要求的方案。"
-                        )
-                        if chat_history[0]["role"] == "system":
-                            chat_history[0]["content"] = new_system_content
                 else:
                     print("✨😊 太棒了！很高兴能帮到您。")
 
+                save_checkpoint(0, True)
                 break
 
             tool_name = re.search(r"(\w+)\(", action_str).group(1)
             args_str = re.search(r"\((.*)\)", action_str).group(1)
             kwargs = dict(re.findall(r'(\w+)="([^"]*)"', args_str))
 
-            if tool_name in skills:
-                observation = skills[tool_name](**kwargs)
-            else:
-                observation = f"错误:未定义的工具 '{tool_name}'"
+            # 切换到新城市时，只把该城市相关的约束放进系统提示
+            if kwargs.get("city") and kwargs["city"] != user_memory["city"]:
+                user_memory["city"] = kwargs["city"]
+                chat_history[0]["content"] = build_system_prompt(
+                    store, user_memory, reflection=UNSATISFIED_flag >= 3
+                )
+
+            with profiler.phase("tool"):
+                if tool_name in skills:
+                    observation = skills[tool_name](**kwargs)
+                    # 超出预算的结果（如 Tavily 的长篇回答）先在本地压缩，再进入对话历史
+                    observation = fit_observation(tool_name, observation, " ".join(kwargs.values()))
+                else:
+                    observation = f"错误:未定义的工具 '{tool_name}'"
 
             # 记录观察结果
-            chat_history.append(
-                {"role": "user", "content": f"Observation: {observation}"}
-            )
+            with profiler.phase("history"):
+                chat_history.append(
+                    {"role": "user", "content": f"Observation: {observation}"}
+                )
+            save_checkpoint(i + 1, False)
+        start_iteration = 0
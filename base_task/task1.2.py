@@ -1,5 +1,11 @@
+import argparse
+import json
+import os
 import re
 import random
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 # 定义规则库:模式(正则表达式) -> 响应模板列表
 rules = {
@@ -57,35 +63,154 @@ pronoun_swap = {
 }
 
 
+# 预编译规则库，避免每条输入都重新查找正则缓存
+compiled_rules = [
+    (re.compile(pattern, re.IGNORECASE), responses)
+    for pattern, responses in rules.items()
+]
+
+# 一次扫描完成代词替换：空白统一成单个空格，命中的整词直接查表替换
+# 这样与原先 split -> 查表 -> join 的结果完全一致
+_pronoun_pattern = re.compile(
+    r"\s+|(?<!\S)(?:"
+    + "|".join(re.escape(w) for w in sorted(pronoun_swap, key=len, reverse=True))
+    + r")(?!\S)"
+)
+
+
+def _swap_match(match):
+    return pronoun_swap.get(match.group(0), " ")
+
+
 def swap_pronouns(phrase):
     """
     对输入短语中的代词进行第一/第二人称转换
     """
-    words = phrase.lower().split()
-    swapped_words = [pronoun_swap.get(word, word) for word in words]
-    return " ".join(swapped_words)
+    return _pronoun_pattern.sub(_swap_match, phrase.lower()).strip()
 
 
-def respond(user_input):
+def respond(user_input, rng=random):
     """
     根据规则库生成响应
+
+    Args:
+        user_input: 用户输入
+        rng: 随机数生成器，批处理时传入按记录播种的 random.Random 以便复现
     """
-    for pattern, responses in rules.items():
-        match = re.search(pattern, user_input, re.IGNORECASE)
+    for pattern, responses in compiled_rules:
+        match = pattern.search(user_input)
         if match:
             # 捕获匹配到的部分
             captured_group = match.group(1) if match.groups() else ""
             # 进行代词转换
             swapped_group = swap_pronouns(captured_group)
             # 从模板中随机选择一个并格式化
-            response = random.choice(responses).format(swapped_group)
+            response = rng.choice(responses).format(swapped_group)
             return response
     # 如果没有匹配任何特定规则，使用最后的通配符规则
-    return random.choice(rules[r".*"])
+    return rng.choice(rules[r".*"])
+
+
+def _parse_line(line, field):
+    """解析一行输入：JSONL 记录取指定字段，纯文本行直接作为输入"""
+    text = line.rstrip("\n")
+    if text.lstrip().startswith("{"):
+        try:
+            record = json.loads(text)
+            return record, str(record.get(field, ""))
+        except json.JSONDecodeError:
+            pass
+    return {field: text}, text
+
+
+def _respond_chunk(args):
+    """在工作进程中处理一批 (行号, 行内容)，返回序列化好的输出行"""
+    chunk, seed, field = args
+    lines = []
+    for index, line in chunk:
+        record, text = _parse_line(line, field)
+        # 每条记录独立播种：与进程数、分块大小无关，结果可复现
+        rng = random.Random(f"{seed}:{index}") if seed is not None else random
+        record["response"] = respond(text, rng)
+        record.setdefault("line", index)
+        lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+    return lines
+
+
+def _read_chunks(stream, chunk_size):
+    """按块读取输入，空行跳过但保留行号"""
+    chunk = []
+    for index, line in enumerate(stream):
+        if not line.strip():
+            continue
+        chunk.append((index, line))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_batch(stream, out, workers=None, seed=None, field="text", chunk_size=1000):
+    """
+    批量处理聊天记录，结果以 JSONL 按输入顺序写出
+
+    - 输入可以是 JSONL（取 field 字段）或纯文本（每行一条）
+    - 使用进程池并行处理，最多同时挂起 workers * 2 个块，内存占用有上限
+    """
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        max_pending = workers * 2
+        pending = deque()
+        total = 0
+        for chunk in _read_chunks(stream, chunk_size):
+            pending.append(pool.submit(_respond_chunk, (chunk, seed, field)))
+            # 窗口已满时先按顺序写出最早提交的块
+            if len(pending) >= max_pending:
+                lines = pending.popleft().result()
+                out.writelines(lines)
+                total += len(lines)
+        while pending:
+            lines = pending.popleft().result()
+            out.writelines(lines)
+            total += len(lines)
+    return total
 
 
 # 主聊天循环
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="基于规则的聊天机器人")
+    parser.add_argument("--batch", help="批处理输入文件（JSONL 或纯文本），- 表示标准输入")
+    parser.add_argument("--output", default="-", help="批处理输出文件，默认标准输出")
+    parser.add_argument("--field", default="text", help="JSONL 中用户输入所在的字段")
+    parser.add_argument("--workers", type=int, default=None, help="进程数，默认 CPU 核数")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="每个任务块的行数")
+    parser.add_argument("--seed", type=int, default=None, help="随机种子，设置后结果可复现")
+    cli_args = parser.parse_args()
+
+    if cli_args.batch:
+        src = (
+            sys.stdin
+            if cli_args.batch == "-"
+            else open(cli_args.batch, encoding="utf-8")
+        )
+        dst = (
+            sys.stdout
+            if cli_args.output == "-"
+            else open(cli_args.output, "w", encoding="utf-8")
+        )
+        with src, dst:
+            count = run_batch(
+                src,
+                dst,
+                workers=cli_args.workers,
+                seed=cli_args.seed,
+                field=cli_args.field,
+                chunk_size=cli_args.chunk_size,
+            )
+        print(f"批处理完成，共处理 {count} 条记录。", file=sys.stderr)
+        sys.exit(0)
+
     print("Therapist: Hello! How can I help you today?")
     while True:
         user_input = input("You: ")